@@ -6,10 +6,13 @@ import shutil
 from PIL import Image
 import pandas as pd
 from datetime import datetime
+import time
 import zipfile
 
-from utils.detector import VehicleDetector
 from utils.reporter import generate_report, generate_summary_stats
+from utils.store import DetectionStore
+from utils.roi import load_roi_config
+from utils import metrics
 from utils.image_helper import  display_sidebar_logo
 from pathlib import Path
 # Page configuration
@@ -43,6 +46,8 @@ def initialize_session_state():
         st.session_state.results = None
     if 'mode' not in st.session_state:
         st.session_state.mode = "Single Image"
+    if 'live_running' not in st.session_state:
+        st.session_state.live_running = False
 
 
 def save_uploaded_file(uploaded_file, upload_dir):
@@ -56,6 +61,168 @@ def save_uploaded_file(uploaded_file, upload_dir):
     return file_path
 
 
+def get_detection_store():
+    """One detection store connection per browser session, reused by every run"""
+    if 'detection_store' not in st.session_state:
+        st.session_state.detection_store = DetectionStore("store/detections.db")
+    return st.session_state.detection_store
+
+
+@st.cache_resource(show_spinner=False)
+def load_model(model_path):
+    """Load the model once per server process; VehicleDetector serialises calls into it"""
+    # Deferred so the page renders before ultralytics/torch are imported
+    from utils.detector import load_model as load_yolo_model
+    return load_yolo_model(model_path)
+
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_exporters():
+    """Expose metrics once per server process, configured through environment variables"""
+    # Failures are returned rather than raised: cache_resource does not cache exceptions,
+    # so a busy port would otherwise break every rerun
+    problems = []
+    port = os.environ.get("NEURODRIVE_METRICS_PORT")
+    if port:
+        try:
+            metrics.start_http_server(int(port), host=os.environ.get("NEURODRIVE_METRICS_HOST", "127.0.0.1"))
+        except (OSError, ValueError) as e:
+            problems.append(f"Metrics endpoint on port {port} not started: {e}")
+    
+    metrics_file = os.environ.get("NEURODRIVE_METRICS_FILE")
+    if metrics_file:
+        metrics.start_file_writer(metrics_file)
+    
+    return problems
+
+
+def render_metrics_panel():
+    """Live process metrics in the sidebar"""
+    st.markdown("### Live Metrics")
+    
+    p50 = metrics.INFERENCE_LATENCY.quantile(0.5, mode='batch') or metrics.INFERENCE_LATENCY.quantile(0.5, mode='single')
+    p95 = metrics.INFERENCE_LATENCY.quantile(0.95, mode='batch') or metrics.INFERENCE_LATENCY.quantile(0.95, mode='single')
+    
+    col1, col2 = st.columns(2)
+    col1.metric("Images", int(metrics.IMAGES_PROCESSED.total()))
+    col2.metric("Vehicles", int(metrics.DETECTIONS.total()))
+    col1.metric("Latency p50", f"{p50 * 1000:.0f} ms" if p50 is not None else "–")
+    col2.metric("Latency p95", f"{p95 * 1000:.0f} ms" if p95 is not None else "–")
+    col1.metric("Cache Hits", int(metrics.CACHE_HITS.total()))
+    col2.metric("Errors", int(metrics.ERRORS.total()))
+    col1.metric("Queue", int(metrics.QUEUE_DEPTH.value()))
+    col2.metric("Memory", f"{metrics.PROCESS_RSS.value() / (1024 * 1024):.0f} MB")
+    st.caption(f"Model loads: {int(metrics.MODEL_LOADS.value())}")
+
+
+# Refresh the panel on its own timer where Streamlit supports fragments
+if hasattr(st, "fragment"):
+    render_metrics_panel = st.fragment(run_every=5)(render_metrics_panel)
+
+
+def render_roi_counts(roi_counts):
+    """Per-ROI (lane) vehicle counts by class"""
+    if not roi_counts:
+        return
+    
+    st.markdown("### Counts per ROI")
+    df = pd.DataFrame.from_dict(roi_counts, orient='index').fillna(0).astype(int)
+    df['Total'] = df.sum(axis=1) if not df.empty else 0
+    st.dataframe(df, use_container_width=True)
+
+
+# Live mode gives up on a source that delivers no new frame for this long (seconds)
+LIVE_STALL_TIMEOUT = 15.0
+
+
+def run_live_mode(model_path, confidence, roi, source, target_fps):
+    """Detect on a live source until stopped, adapting quality to hold the target FPS"""
+    from utils.detector import VehicleDetector
+    from utils.live import AdaptiveController, LatestFrameReader, LivePipeline, available_quality_levels
+    from utils.rollups import RollupStore
+    
+    detectors = {}
+    
+    def get_detector(level_model_path):
+        key = level_model_path or str(model_path)
+        if key not in detectors:
+            detectors[key] = VehicleDetector(key, confidence_threshold=confidence, model=load_model(key))
+        return detectors[key]
+    
+    try:
+        reader = LatestFrameReader(source).start()
+    except ValueError as e:
+        st.error(str(e))
+        st.session_state.live_running = False
+        return
+    
+    levels = available_quality_levels()
+    pipeline = LivePipeline(reader, AdaptiveController(target_fps, levels), get_detector, roi=roi)
+    
+    # Every displayed frame feeds the per-minute/hour/day occupancy rollups (vehicles in
+    # view per frame; vehicles are not tracked, so this is not a count of vehicles passing)
+    rollups = RollupStore()
+    camera_id = roi.camera_id if roi is not None else f"live:{source}"
+    
+    stats_placeholder = st.empty()
+    status_placeholder = st.empty()
+    frame_placeholder = st.empty()
+    
+    last_frame_time = time.perf_counter()
+    last_notice = None
+    stalled = False
+    
+    try:
+        # Leaving the page or pressing Stop reruns the script, which ends this loop
+        while not reader.finished:
+            frame_start = time.perf_counter()
+            output = pipeline.step()
+            if output is None:
+                waited = frame_start - last_frame_time
+                if waited >= LIVE_STALL_TIMEOUT:
+                    stalled = True
+                    break
+                
+                # Streamlit only sees a Stop click at its next element call, so keep
+                # touching the page while the source is silent
+                if waited >= 1.0 and (last_notice is None or frame_start - last_notice >= 0.5):
+                    status_placeholder.caption(f"Waiting for frames from {source}... {waited:.0f} s")
+                    last_notice = frame_start
+                time.sleep(0.005)
+                continue
+            
+            last_frame_time = frame_start
+            if last_notice is not None:
+                status_placeholder.empty()
+                last_notice = None
+            
+            annotated, info = output
+            rollups.add(time.time(), info['detections'], camera_id=camera_id)
+            frame_placeholder.image(annotated, channels="BGR", use_container_width=True)
+            
+            level = info['level']
+            cols = stats_placeholder.columns(4)
+            cols[0].metric("Achieved FPS", f"{info['fps']:.1f}", f"target {target_fps}", delta_color="off")
+            cols[1].metric("Quality", f"{info['level_index'] + 1}/{len(levels)}", level['name'], delta_color="off")
+            cols[2].metric("Inference Size", level['imgsz'])
+            cols[3].metric("Vehicles in View", len(info['detections']['labels']))
+            pipeline.finish_frame()
+            
+            # Never run faster than the target; spare time is headroom for higher quality
+            remaining = 1.0 / target_fps - (time.perf_counter() - frame_start)
+            if remaining > 0:
+                time.sleep(remaining)
+    finally:
+        reader.stop()
+        rollups.close()
+    
+    st.session_state.live_running = False
+    if stalled:
+        st.warning(f"No frames from {source} for {LIVE_STALL_TIMEOUT:.0f} s, live session stopped.")
+    else:
+        st.info("Video source ended.")
+
+
 import base64
 
 def get_img_as_base64(file):
@@ -65,6 +232,11 @@ def get_img_as_base64(file):
 
 def main():
     initialize_session_state()
+    for problem in start_metrics_exporters():
+        st.sidebar.warning(problem)
+    
+    with st.sidebar:
+        render_metrics_panel()
     
     # Check if model exists
     model_path = Path("models/best.pt")
@@ -111,7 +283,7 @@ cp ../runs/detect/vehicle_detector3/weights/best.pt models/best.pt
             """, unsafe_allow_html=True)
             mode = st.radio(
                 "Input Mode:",
-                ["Single Image", "Folder"],
+                ["Single Image", "Folder", "Live"],
                 key="mode_selector",
                 horizontal=True
             )
@@ -124,6 +296,34 @@ cp ../runs/detect/vehicle_detector3/weights/best.pt models/best.pt
                 step=0.05,
                 help="Minimum confidence score for detections"
             )
+            
+            dedup_distance = None
+            if mode == "Folder":
+                skip_duplicates = st.checkbox(
+                    "Skip near-duplicate images",
+                    value=False,
+                    help="Run inference once per group of near-identical frames"
+                )
+                if skip_duplicates:
+                    dedup_distance = st.slider(
+                        "Duplicate Distance",
+                        min_value=0,
+                        max_value=16,
+                        value=5,
+                        step=1,
+                        help="Maximum perceptual hash difference (bits) to treat images as duplicates"
+                    )
+            
+            # Fixed cameras can restrict inference to their road polygons
+            roi = None
+            cameras = load_roi_config()
+            if cameras:
+                camera_id = st.selectbox(
+                    "Camera ROI",
+                    ["Full frame"] + sorted(cameras),
+                    help="Only detect inside this camera's road polygons (config/roi.json)"
+                )
+                roi = cameras.get(camera_id)
 
         with col2:
             st.markdown("""
@@ -133,7 +333,21 @@ cp ../runs/detect/vehicle_detector3/weights/best.pt models/best.pt
             </div>
             """, unsafe_allow_html=True)
             uploaded_files = None
-            if mode == "Single Image":
+            if mode == "Live":
+                live_source = st.text_input(
+                    "Camera or video source",
+                    value="0",
+                    help="Camera index (0, 1, ...), video file path or stream URL"
+                )
+                target_fps = st.slider(
+                    "Target FPS",
+                    min_value=1,
+                    max_value=30,
+                    value=10,
+                    step=1,
+                    help="Quality is lowered automatically when this rate cannot be kept"
+                )
+            elif mode == "Single Image":
                 uploaded_files = st.file_uploader(
                     "Choose an image file",
                     type=["jpg", "jpeg", "png", "bmp"],
@@ -154,7 +368,18 @@ cp ../runs/detect/vehicle_detector3/weights/best.pt models/best.pt
             </div>
             """, unsafe_allow_html=True)
             st.markdown("<div style='height: 24px'></div>", unsafe_allow_html=True) # Spacer for alignment
-            process_btn = st.button("Classify Vehicles", use_container_width=True, type="primary")
+            if mode == "Live":
+                process_btn = False
+                # Callbacks run before the rerun, so the Stop button is shown while the loop runs
+                if st.session_state.live_running:
+                    st.button("Stop", use_container_width=True,
+                              on_click=lambda: st.session_state.update(live_running=False))
+                else:
+                    st.button("Start Live", use_container_width=True, type="primary",
+                              on_click=lambda: st.session_state.update(live_running=True))
+            else:
+                st.session_state.live_running = False
+                process_btn = st.button("Classify Vehicles", use_container_width=True, type="primary")
             
             # Mini stats or info could go here
             if uploaded_files:
@@ -165,7 +390,13 @@ cp ../runs/detect/vehicle_detector3/weights/best.pt models/best.pt
     st.markdown("---")
     
     # Main content area
-    if process_btn and uploaded_files:
+    if mode == "Live":
+        if st.session_state.live_running:
+            run_live_mode(model_path, confidence, roi, live_source, target_fps)
+        else:
+            st.info("Press Start Live to begin detecting from the camera or video source.")
+    
+    elif process_btn and uploaded_files:
         # Clear previous results
         if os.path.exists("results"):
             shutil.rmtree("results")
@@ -177,7 +408,14 @@ cp ../runs/detect/vehicle_detector3/weights/best.pt models/best.pt
         
         # Initialize detector
         with st.spinner("🔄 Initializing System..."):
-            detector = VehicleDetector(str(model_path), confidence_threshold=confidence)
+            from utils.detector import VehicleDetector
+            detector = VehicleDetector(
+                str(model_path),
+                confidence_threshold=confidence,
+                store=get_detection_store(),
+                model=load_model(str(model_path))
+            )
+            detector.start_run()
         
         st.success("✅ System Ready!")
         
@@ -197,7 +435,8 @@ cp ../runs/detect/vehicle_detector3/weights/best.pt models/best.pt
             with st.spinner("Processing..."):
                 annotated_path, detections = detector.process_single_image(
                     input_path,
-                    "results"
+                    "results",
+                    roi=roi
                 )
             
             # Display annotated image
@@ -253,6 +492,8 @@ cp ../runs/detect/vehicle_detector3/weights/best.pt models/best.pt
                 df = df.sort_values('Count', ascending=True)
                 st.bar_chart(df.set_index('Class'), horizontal=True)
             
+            render_roi_counts(detections.get('roi_counts'))
+            
             # Download button
             st.markdown("---")
             with open(annotated_path, "rb") as file:
@@ -278,12 +519,21 @@ cp ../runs/detect/vehicle_detector3/weights/best.pt models/best.pt
             progress_bar = st.progress(0)
             status_text = st.empty()
             
+            results = []
+            total_files = len(uploaded_files)
+            
             with st.spinner("Processing batch..."):
-                results = detector.process_folder(
+                for result in detector.iter_folder(
                     folder_path,
                     "results/batch",
-                    organize_by_class=True
-                )
+                    organize_by_class=True,
+                    dedup_distance=dedup_distance,
+                    roi=roi,
+                    sort_by_name=True
+                ):
+                    results.append(result)
+                    progress_bar.progress(min(len(results) / total_files, 1.0))
+                    status_text.text(f"Processed {len(results)}/{total_files}: {result['image_name']}")
             
             progress_bar.progress(100)
             status_text.success(f"✅ Processed {len(results)} images")
@@ -291,6 +541,9 @@ cp ../runs/detect/vehicle_detector3/weights/best.pt models/best.pt
             # Generate summary statistics
             summary = generate_summary_stats(results)
             
+            if summary['deduplicated_images']:
+                st.info(f"Skipped inference on {summary['deduplicated_images']} near-duplicate image(s)")
+            
             # Display overall statistics
             st.markdown("---")
             st.subheader("Batch Summary")
@@ -345,6 +598,8 @@ cp ../runs/detect/vehicle_detector3/weights/best.pt models/best.pt
                 df = df.sort_values('Count', ascending=True)
                 st.bar_chart(df.set_index('Class'), horizontal=True)
             
+            render_roi_counts(summary['roi_distribution'])
+            
             # Generate and display report
             st.markdown("---")
             st.subheader("Report")
@@ -411,6 +666,7 @@ cp ../runs/detect/vehicle_detector3/weights/best.pt models/best.pt
     <ul>
         <li><b>Single Image:</b> Detect vehicles in one image</li>
         <li><b>Batch Processing:</b> Process multiple images at once</li>
+        <li><b>Live:</b> Real-time detection from a camera or video at a target FPS</li>
         <li><b>Classification:</b> Automated vehicle categorization</li>
         <li><b>Export:</b> Download reports and images</li>
     </ul>
@@ -0,0 +1,97 @@
+"""
+Inference Auto-Tuner - Vehicle Detection System
+Sweeps torch threads, batch size and memory format on a local image sample,
+then saves the fastest settings for this host. VehicleDetector loads the saved
+profile automatically. The inference size is not swept: it changes accuracy,
+so it is chosen explicitly after checking its cost with evaluate.py.
+
+Usage:
+    python autotune.py [--images ../test_images] [--imgsz 480] [--batch 1 4 8]
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+from utils.detector import VehicleDetector, iter_image_files
+from utils.tuning import DEFAULT_PROFILE_PATH, autotune, candidate_threads, save_profile
+
+
+MODEL_PATH = "models/best.pt"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the fastest CPU inference settings for this host")
+    parser.add_argument("--images", help="Folder of sample images (default: ../test_images next to this script)")
+    parser.add_argument("--max-images", type=int, default=16, help="Number of sample images to time")
+    parser.add_argument("--threads", type=int, nargs="+", help="torch intra-op thread counts to try")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 4, 8], help="Batch sizes to try")
+    parser.add_argument(
+        "--imgsz", type=int,
+        help="Inference size to tune at (default: the model's own). Smaller sizes are faster "
+             "but less accurate; compare them with evaluate.py --modes first"
+    )
+    parser.add_argument("--no-channels-last", action="store_true", help="Only try the default memory format")
+    parser.add_argument("--output", help=f"Profile file to write (default: {DEFAULT_PROFILE_PATH})")
+    args = parser.parse_args()
+
+    # Paths given on the command line are relative to where the user ran it
+    images = os.path.abspath(args.images) if args.images else "../test_images"
+    output = os.path.abspath(args.output) if args.output else str(DEFAULT_PROFILE_PATH)
+    os.chdir(Path(__file__).parent)
+
+    if not Path(MODEL_PATH).exists():
+        print(f" Model not found at {MODEL_PATH}")
+        return
+
+    sample = []
+    for image_path in iter_image_files(images, sort_by_name=True):
+        sample.append(image_path)
+        if len(sample) >= args.max_images:
+            break
+
+    if not sample:
+        print(f" No images found in {images}")
+        return
+
+    threads = args.threads or candidate_threads()
+    memory_formats = (False,) if args.no_channels_last else (False, True)
+    total = len(threads) * len(args.batch) * len(memory_formats)
+
+    print("="*60)
+    print(f"Auto-tuning on {len(sample)} images, {total} settings, imgsz={args.imgsz or 'model default'}")
+    print("="*60)
+
+    # Start from defaults, not from a previously saved profile
+    detector = VehicleDetector(MODEL_PATH, profile_path=None)
+
+    def report(trial):
+        print(f"   threads={trial['torch_threads']:<3} batch={trial['batch_size']:<3} "
+              f"channels_last={str(trial['channels_last']):<6} "
+              f"{trial['throughput_ips']:7.2f} img/s  {trial['latency_ms']:8.1f} ms/img")
+
+    profile = autotune(
+        detector,
+        sample,
+        threads=threads,
+        batch_sizes=args.batch,
+        imgsz=args.imgsz,
+        memory_formats=memory_formats,
+        progress=report
+    )
+
+    profile_path = save_profile(profile, output)
+
+    print("\n Best settings:")
+    print(f"   torch threads : {profile['torch_threads']}")
+    print(f"   batch size    : {profile['batch_size']}")
+    print(f"   imgsz         : {profile['imgsz'] or 'model default'}")
+    print(f"   channels_last : {profile['channels_last']}")
+    print(f"   throughput    : {profile['throughput_ips']:.2f} img/s")
+    print(f"   latency       : {profile['latency_ms']:.1f} ms/img")
+    print(f"\n Profile saved for {profile['host']}: {profile_path}")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
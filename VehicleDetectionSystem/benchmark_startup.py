@@ -0,0 +1,104 @@
+"""
+Startup Benchmark - Vehicle Detection System
+Measures cold start in fresh interpreters: time until the app page has
+rendered, time until the first detection (imports, model load, first
+predict), and a second detection on the already loaded model, which is
+what every later request costs once st.cache_resource holds the model.
+
+Usage:
+    python benchmark_startup.py [--image ../test_images/bus.jpg] [--repeat 3]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+MODEL_PATH = "models/best.pt"
+
+# Each snippet runs in a new interpreter and prints its elapsed seconds
+PAGE_RENDER = """
+import time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+AppTest.from_file("app.py", default_timeout=120).run()
+print(time.perf_counter() - start)
+"""
+
+FIRST_DETECTION = """
+import time
+start = time.perf_counter()
+from utils.detector import VehicleDetector
+detector = VehicleDetector({model!r})
+detector.detect({image!r})
+print(time.perf_counter() - start)
+"""
+
+WARM_DETECTION = """
+import time
+from utils.detector import VehicleDetector
+detector = VehicleDetector({model!r})
+detector.detect({image!r})
+start = time.perf_counter()
+detector.detect({image!r})
+print(time.perf_counter() - start)
+"""
+
+
+def run_snippet(code):
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return float(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(name, code, repeat):
+    timings = [run_snippet(code) for _ in range(repeat)]
+    print(f"   {name:<38} median {statistics.median(timings):6.2f}s   "
+          f"min {min(timings):6.2f}s   max {max(timings):6.2f}s")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start times")
+    parser.add_argument("--image", default="../test_images/bus.jpg")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if not Path(MODEL_PATH).exists():
+        print(f" Model not found at {MODEL_PATH}")
+        return
+
+    print("="*60)
+    print("Cold Start Benchmark")
+    print("="*60)
+
+    measure("App page render (AppTest)", PAGE_RENDER, args.repeat)
+
+    if not Path(args.image).exists():
+        print(f" Test image not found: {args.image}")
+        return
+
+    measure(
+        "First detection (fresh interpreter)",
+        FIRST_DETECTION.format(model=MODEL_PATH, image=args.image),
+        args.repeat
+    )
+    measure(
+        "Detection with the model loaded",
+        WARM_DETECTION.format(model=MODEL_PATH, image=args.image),
+        args.repeat
+    )
+
+    print("="*60)
+
+
+if __name__ == "__main__":
+    os.chdir(Path(__file__).parent)
+    main()
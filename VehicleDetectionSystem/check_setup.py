@@ -1,4 +1,5 @@
 
+import importlib.util
 import os
 import sys
 from pathlib import Path
@@ -30,17 +31,12 @@ def check_requirements():
         'numpy'
     ]
     
+    # Locate packages without importing them; importing ultralytics pulls in torch
     missing_packages = []
     for package in required_packages:
-        try:
-            if package == 'cv2':
-                __import__('cv2')
-            elif package == 'PIL':
-                __import__('PIL')
-            else:
-                __import__(package)
+        if importlib.util.find_spec(package) is not None:
             print(f"✓ Package '{package}' installed")
-        except ImportError:
+        else:
             print(f"✗ Package '{package}' NOT installed")
             missing_packages.append(package)
     
@@ -0,0 +1,146 @@
+"""
+Offline Evaluation - Vehicle Detection System
+Runs the production VehicleDetector over a YOLO-format labelled set and
+reports per-class precision, recall and mAP next to throughput for each
+speed mode, so every speed/accuracy trade-off has a documented cost.
+
+Modes are written as IMGSZxBATCH with an optional +cl suffix for
+channels_last, or "profile" for the auto-tuned profile of this host.
+
+Usage:
+    python evaluate.py --images "../datasets/Vehicle data set v5/valid/images"
+    python evaluate.py --images <dir> --modes 640x1 640x8 480x8+cl profile --output eval.json
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+from utils.detector import VehicleDetector, iter_chunks, iter_image_files
+from utils.evaluation import EvaluationAccumulator, label_path_for, load_yolo_labels
+from utils.tuning import load_profile
+
+
+MODEL_PATH = "models/best.pt"
+
+
+def parse_mode(mode, default_threads):
+
+    if mode == "profile":
+        profile = load_profile()
+        if profile is None:
+            raise SystemExit(" No auto-tuned profile for this host, run autotune.py first")
+        return profile
+
+    channels_last = mode.endswith("+cl")
+    size, _, batch = mode.replace("+cl", "").partition("x")
+    return {
+        'torch_threads': default_threads,
+        'imgsz': int(size),
+        'batch_size': int(batch or 1),
+        'channels_last': channels_last,
+    }
+
+
+def evaluate_mode(detector, image_paths, settings, serving_conf):
+
+    detector.apply_profile(settings)
+    accumulator = EvaluationAccumulator(detector.model.names)
+
+    # Warm up outside the timed region
+    detector.detect_batch(image_paths[:detector.batch_size])
+
+    inference_time = 0.0
+    for chunk in iter_chunks(image_paths, detector.batch_size):
+        start = time.perf_counter()
+        batch_detections = detector.detect_batch(chunk)
+        inference_time += time.perf_counter() - start
+
+        for image_path, detections in zip(chunk, batch_detections):
+            gt_classes, gt_boxes = load_yolo_labels(label_path_for(image_path), detections['image_size'])
+            accumulator.add(detections, gt_classes, gt_boxes)
+
+    metrics = accumulator.compute(serving_conf=serving_conf)
+    metrics['throughput_ips'] = len(image_paths) / inference_time if inference_time else 0.0
+    metrics['images'] = len(image_paths)
+    return metrics
+
+
+def print_mode(name, metrics):
+
+    overall = metrics['overall']
+    print(f"\n Mode {name}: {metrics['throughput_ips']:.2f} img/s over {metrics['images']} images")
+    print(f"   {'Class':<15}{'Inst':>7}{'P':>8}{'R':>8}{'mAP50':>8}{'mAP50-95':>10}")
+    for class_name, m in metrics['classes'].items():
+        print(f"   {class_name:<15}{m['instances']:>7}{m['precision']:>8.3f}{m['recall']:>8.3f}"
+              f"{m['map50']:>8.3f}{m['map50_95']:>10.3f}")
+    print(f"   {'all':<15}{'':>7}{overall['precision']:>8.3f}{overall['recall']:>8.3f}"
+          f"{overall['map50']:>8.3f}{overall['map50_95']:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the production detector on a labelled set")
+    parser.add_argument("--images", required=True, help="Folder of images with a sibling labels/ folder")
+    parser.add_argument("--modes", nargs="+", default=["640x1"], help="Speed modes, e.g. 640x1 480x8+cl profile")
+    parser.add_argument("--max-images", type=int, help="Evaluate only the first N images")
+    parser.add_argument(
+        "--eval-conf", type=float, default=0.001,
+        help="Detector threshold while evaluating; low so the full PR curve is scored"
+    )
+    parser.add_argument("--serving-conf", type=float, default=0.25, help="Threshold used for P and R")
+    parser.add_argument("--output", help="Write all metrics to this JSON file")
+    args = parser.parse_args()
+
+    # Paths given on the command line are relative to where the user ran it
+    images = os.path.abspath(args.images)
+    output = os.path.abspath(args.output) if args.output else None
+    os.chdir(Path(__file__).parent)
+
+    if not Path(MODEL_PATH).exists():
+        print(f" Model not found at {MODEL_PATH}")
+        return
+
+    image_paths = []
+    for image_path in iter_image_files(images, sort_by_name=True):
+        image_paths.append(image_path)
+        if args.max_images and len(image_paths) >= args.max_images:
+            break
+
+    if not image_paths:
+        print(f" No images found in {images}")
+        return
+
+    detector = VehicleDetector(MODEL_PATH, confidence_threshold=args.eval_conf, profile_path=None)
+    detector.float_boxes = True
+    
+    # Explicit modes run with torch's default thread count, even after a tuned profile
+    import torch
+    default_threads = torch.get_num_threads()
+
+    print("="*60)
+    print(f"Evaluating {len(image_paths)} images, {len(args.modes)} mode(s)")
+    print("="*60)
+
+    all_metrics = {}
+    for mode in args.modes:
+        all_metrics[mode] = evaluate_mode(detector, image_paths, parse_mode(mode, default_threads), args.serving_conf)
+        print_mode(mode, all_metrics[mode])
+
+    print("\n Summary")
+    print(f"   {'Mode':<14}{'img/s':>8}{'mAP50':>8}{'mAP50-95':>10}")
+    for mode, metrics in all_metrics.items():
+        print(f"   {mode:<14}{metrics['throughput_ips']:>8.2f}{metrics['overall']['map50']:>8.3f}"
+              f"{metrics['overall']['map50_95']:>10.3f}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(all_metrics, f, indent=2)
+        print(f"\n Metrics saved: {output}")
+
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Detection Store Query Tool - Vehicle Detection System
+Answers class, count, confidence and region questions from the indexed
+detection store without re-reading reports or re-running inference.
+
+Examples:
+    python query_detections.py runs
+    python query_detections.py images --class bus --min-count 3
+    python query_detections.py boxes --class truck --min-area 40000 --region 0 0 1 0.5
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from utils.store import DetectionStore
+
+
+DEFAULT_DB = "store/detections.db"
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Query the local detection store")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"Path to the store (default: {DEFAULT_DB})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("runs", help="List recorded runs")
+
+    images = subparsers.add_parser("images", help="Images with a given number of vehicles of a class")
+    images.add_argument("--class", dest="class_name", required=True)
+    images.add_argument("--min-count", type=int, default=1)
+    images.add_argument("--max-count", type=int)
+    images.add_argument("--run")
+    images.add_argument("--limit", type=int, default=50)
+
+    boxes = subparsers.add_parser("boxes", help="Individual detections matching filters")
+    boxes.add_argument("--class", dest="class_name")
+    boxes.add_argument("--min-confidence", type=float)
+    boxes.add_argument("--min-area", type=int, help="Minimum box area in pixels")
+    boxes.add_argument(
+        "--region", type=float, nargs=4, metavar=("X1", "Y1", "X2", "Y2"),
+        help="Normalised frame region (0-1) that boxes must lie inside"
+    )
+    boxes.add_argument("--run")
+    boxes.add_argument("--limit", type=int, default=50)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if not Path(args.db).exists():
+        print(f" Detection store not found: {args.db}")
+        return 1
+
+    with DetectionStore(args.db) as store:
+        start = time.perf_counter()
+
+        if args.command == "runs":
+            rows = store.list_runs()
+            for row in rows:
+                print(f"{row['run_id']}  {row['created_at']}  {row['images']} images  {row['model_path']}")
+
+        elif args.command == "images":
+            rows = store.query_images(
+                args.class_name,
+                min_count=args.min_count,
+                max_count=args.max_count,
+                run_id=args.run,
+                limit=args.limit
+            )
+            for row in rows:
+                print(f"{row['run_id']}  {row['image_name']}  {row['class_name']}: {row['count']}")
+
+        else:
+            rows = store.query_detections(
+                class_name=args.class_name,
+                min_confidence=args.min_confidence,
+                min_area=args.min_area,
+                region=args.region,
+                run_id=args.run,
+                limit=args.limit
+            )
+            for row in rows:
+                print(f"{row['run_id']}  {row['image_name']}  {row['class_name']} "
+                      f"{row['confidence']:.2f}  {row['box']}")
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"\n {len(rows)} row(s) in {elapsed_ms:.1f} ms")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
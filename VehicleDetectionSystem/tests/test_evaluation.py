@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from utils.evaluation import (
+    IOU_THRESHOLDS, EvaluationAccumulator, _average_precision, compute_metrics, match_predictions
+)
+
+
+CLASS_NAMES = {0: 'car', 1: 'bus'}
+
+
+def test_perfect_detections_score_like_ultralytics():
+    gt_classes = np.array([0, 1])
+    gt_boxes = np.array([[10, 10, 50, 50], [100, 100, 200, 180]], dtype=np.float32)
+
+    correct = match_predictions(gt_classes, gt_boxes, gt_classes, gt_boxes)
+    assert correct.all()
+
+    metrics = compute_metrics(correct, [0.9, 0.8], gt_classes, gt_classes, CLASS_NAMES)
+
+    # ultralytics' compute_ap gives 0.995 for a perfect curve: the trapezoid over the
+    # last 0.01 of recall runs down to the appended precision-0 sentinel
+    assert metrics['overall']['map50'] == pytest.approx(0.995)
+    assert metrics['overall']['map50_95'] == pytest.approx(0.995)
+    assert metrics['overall']['precision'] == 1.0
+    assert metrics['overall']['recall'] == 1.0
+
+
+def test_one_false_positive_and_one_false_negative():
+    gt_classes = np.array([0, 0])
+    gt_boxes = np.array([[10, 10, 50, 50], [300, 300, 340, 340]], dtype=np.float32)
+
+    # One exact hit on the first car, one box nowhere near the second
+    pred_classes = np.array([0, 0])
+    pred_boxes = np.array([[10, 10, 50, 50], [120, 10, 160, 50]], dtype=np.float32)
+
+    correct = match_predictions(pred_classes, pred_boxes, gt_classes, gt_boxes)
+    assert correct[0].all()
+    assert not correct[1].any()
+
+    metrics = compute_metrics(correct, [0.9, 0.6], pred_classes, gt_classes, CLASS_NAMES)
+    car = metrics['classes']['car']
+
+    assert car['instances'] == 2
+    assert car['precision'] == pytest.approx(0.5)
+    assert car['recall'] == pytest.approx(0.5)
+    # Envelope is 1.0 up to recall 0.5, then falls linearly from 0.5 to 0 at recall 1.0;
+    # ultralytics' compute_ap gives 0.6225 for the same curve
+    assert car['map50'] == pytest.approx(0.6225)
+    assert 'bus' not in metrics['classes']
+
+
+def test_ground_truth_is_matched_once():
+    gt_classes = np.array([0])
+    gt_boxes = np.array([[10, 10, 50, 50]], dtype=np.float32)
+
+    # Two predictions on the same car, in confidence order: the first one matches even
+    # though the second overlaps better, as in ultralytics val
+    pred_classes = np.array([0, 0])
+    pred_boxes = np.array([[12, 12, 50, 50], [10, 10, 50, 50]], dtype=np.float32)
+
+    correct = match_predictions(pred_classes, pred_boxes, gt_classes, gt_boxes)
+    assert correct[:, 0].tolist() == [True, False]
+    # At IoU 0.95 only the exact box qualifies (the first overlaps 0.90), so it matches there
+    assert not correct[0, -1] and correct[1, -1]
+    assert correct.shape == (2, len(IOU_THRESHOLDS))
+
+
+def test_average_precision_of_empty_curve_is_zero():
+    assert _average_precision(np.array([0.0]), np.array([0.0])) == pytest.approx(0.0, abs=1e-3)
+
+
+def test_accumulator_scores_unrounded_boxes():
+    gt_classes = np.array([0])
+    gt_boxes = np.array([[10.6, 10.6, 20.6, 20.6]], dtype=np.float32)
+    detections = {
+        'labels': ['car'],
+        'confidences': [0.9],
+        'boxes': [[10, 10, 20, 20]],
+        'float_boxes': [[10.6, 10.6, 20.6, 20.6]],
+    }
+
+    accumulator = EvaluationAccumulator(CLASS_NAMES)
+    accumulator.add(detections, gt_classes, gt_boxes)
+    assert accumulator.compute()['overall']['map50_95'] == pytest.approx(0.995)
+
+    # The integer box of the same 10 px car overlaps only 0.79 and misses every threshold above
+    del detections['float_boxes']
+    accumulator = EvaluationAccumulator(CLASS_NAMES)
+    accumulator.add(detections, gt_classes, gt_boxes)
+    assert accumulator.compute()['overall']['map50_95'] < 0.6
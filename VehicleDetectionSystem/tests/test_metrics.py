@@ -0,0 +1,98 @@
+import urllib.request
+
+import pytest
+
+from utils.metrics import Counter, Gauge, Histogram, Registry, start_http_server
+
+
+def test_counter_exposition_matches_prometheus_client():
+    registry = Registry()
+    counter = Counter("jobs", "Jobs done", ["kind"], registry=registry)
+    counter.inc(kind="a")
+    counter.inc(2, kind='say "hi"\n')
+
+    # Family named after the _total sample, as prometheus_client writes it
+    assert registry.render() == (
+        '# HELP jobs_total Jobs done\n'
+        '# TYPE jobs_total counter\n'
+        'jobs_total{kind="a"} 1\n'
+        'jobs_total{kind="say \\"hi\\"\\n"} 2\n'
+    )
+
+
+def test_unlabelled_metrics_are_exposed_before_first_use():
+    registry = Registry()
+    Counter("requests", "Requests", registry=registry)
+    Gauge("depth", "Queue depth", registry=registry)
+    Gauge("rss", "Memory", registry=registry, function=lambda: 1024)
+
+    assert registry.render() == (
+        '# HELP requests_total Requests\n'
+        '# TYPE requests_total counter\n'
+        'requests_total 0\n'
+        '# HELP depth Queue depth\n'
+        '# TYPE depth gauge\n'
+        'depth 0\n'
+        '# HELP rss Memory\n'
+        '# TYPE rss gauge\n'
+        'rss 1024\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = Histogram("latency", "Latency", ["mode"], registry=registry, buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, mode="batch")
+
+    assert registry.render() == (
+        '# HELP latency Latency\n'
+        '# TYPE latency histogram\n'
+        'latency_bucket{mode="batch",le="0.1"} 1\n'
+        'latency_bucket{mode="batch",le="1.0"} 3\n'
+        'latency_bucket{mode="batch",le="+Inf"} 4\n'
+        'latency_sum{mode="batch"} 4.05\n'
+        'latency_count{mode="batch"} 4\n'
+    )
+    assert histogram.count(mode="batch") == 4
+    # Rank 2 of 4 falls in the (0.1, 1.0] bucket holding ranks 2-3
+    assert histogram.quantile(0.5, mode="batch") == pytest.approx(0.55)
+
+
+def test_rendered_text_parses_with_prometheus_client():
+    parser = pytest.importorskip("prometheus_client.parser")
+
+    registry = Registry()
+    Counter("jobs", "Jobs done", ["kind"], registry=registry).inc(kind="a")
+    Histogram("latency", "Latency", registry=registry, buckets=(0.1,)).observe(0.2)
+
+    families = {family.name: family for family in parser.text_string_to_metric_families(registry.render())}
+    assert families["jobs"].type == "counter"
+    assert families["jobs"].samples[0].value == 1
+    assert families["latency"].type == "histogram"
+
+
+def test_misuse_is_rejected():
+    registry = Registry()
+    counter = Counter("jobs", "Jobs done", ["kind"], registry=registry)
+
+    with pytest.raises(ValueError):
+        counter.inc(-1, kind="a")
+    with pytest.raises(ValueError):
+        counter.inc(other="a")
+    with pytest.raises(ValueError):
+        Counter("jobs", "Again", registry=registry)
+
+
+def test_http_server_serves_registry():
+    registry = Registry()
+    Counter("jobs", "Jobs done", registry=registry).inc()
+
+    server = start_http_server(0, registry=registry)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert response.read().decode() == registry.render()
+    finally:
+        server.shutdown()
+        server.server_close()
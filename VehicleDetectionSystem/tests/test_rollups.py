@@ -0,0 +1,131 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from utils.rollups import GRANULARITIES, RollupStore
+
+
+CLASSES = ['car', 'bus', 'truck']
+
+# Short retention so a few days of data cross both boundaries
+RETENTION = {'minute': timedelta(hours=6), 'hour': timedelta(days=3)}
+
+
+def make_observations(now, days=5, seed=0):
+
+    # Irregular frame times over the last few days, with random per-class counts
+    rng = np.random.default_rng(seed)
+    timestamps = now - days * 86400 + np.cumsum(rng.uniform(1, 180, size=days * 1500))
+    timestamps = timestamps[timestamps < now - 1]
+    counts = rng.integers(0, 4, size=(len(timestamps), len(CLASSES)))
+    return [(float(t), dict(zip(CLASSES, map(int, row)))) for t, row in zip(timestamps, counts)]
+
+
+def detections_for(class_counts):
+    labels = [name for name, count in class_counts.items() for _ in range(count)]
+    return {'labels': labels, 'class_counts': {k: v for k, v in class_counts.items() if v}}
+
+
+@pytest.fixture
+def filled_store():
+    now = time.time()
+    store = RollupStore(':memory:', retention=RETENTION, utc_offset=0)
+    observations = make_observations(now)
+    for timestamp, class_counts in observations:
+        store.add(timestamp, detections_for(class_counts), camera_id='junction_1')
+    store.flush()
+    yield store, observations, now
+    store.close()
+
+
+def raw_totals(observations, start, end, width):
+
+    # What totals() should report: every frame whose bucket at the finest retained level
+    # overlaps [start, end), i.e. the range rounded outwards to whole buckets
+    lo = start // width * width
+    selected = [counts for t, counts in observations if lo <= t // width * width < end]
+    frames = [sum(counts.values()) for counts in selected]
+    return {
+        'observations': len(selected),
+        'vehicle_frames': sum(frames),
+        'max_vehicles': max(frames, default=0),
+        'classes': {name: sum(counts[name] for counts in selected) for name in CLASSES},
+    }
+
+
+def assert_totals_match(store, observations, start, end, width):
+    expected = raw_totals(observations, start, end, width)
+    result = store.totals(start, end, camera_id='junction_1')
+
+    assert result['observations'] == expected['observations']
+    assert result['avg_vehicles'] * result['observations'] == pytest.approx(expected['vehicle_frames'])
+    assert result['max_vehicles'] == expected['max_vehicles']
+    for name in CLASSES:
+        class_result = result['classes'].get(name, {'avg_vehicles': 0.0})
+        assert class_result['avg_vehicles'] * result['observations'] == pytest.approx(expected['classes'][name])
+    return result
+
+
+def test_totals_over_unaligned_ranges_equal_raw_sums(filled_store):
+    store, observations, now = filled_store
+    rng = np.random.default_rng(1)
+
+    # Ranges inside minute retention, with edges at arbitrary seconds
+    for _ in range(20):
+        start = now - rng.uniform(60, 5.5 * 3600)
+        end = min(now, start + rng.uniform(30, 5 * 3600))
+        assert_totals_match(store, observations, start, end, GRANULARITIES['minute'])
+
+
+def test_totals_across_day_boundaries_use_coarse_buckets(filled_store):
+    store, observations, now = filled_store
+    hour = GRANULARITIES['hour']
+
+    # Starts inside hour retention but before minute retention: resolved to the hour. 60 h
+    # always contain a whole day, which is answered from its day bucket
+    start = now - 60 * 3600 + 1234.5
+    result = assert_totals_match(store, observations, start, now, hour)
+    assert any(granularity == 'day' for granularity, _, _ in result['spans'])
+    assert all(granularity != 'minute' for granularity, _, _ in result['spans'])
+
+
+def test_totals_beyond_retention_fall_back_to_days(filled_store):
+    store, observations, now = filled_store
+    day = GRANULARITIES['day']
+
+    # Older than hour retention: only day buckets remain, so edges resolve to whole days
+    start = now - 4.5 * 86400
+    end = now - 1.2 * 86400
+    result = assert_totals_match(store, observations, start, end, day)
+    assert {granularity for granularity, _, _ in result['spans']} == {'day'}
+
+
+def test_retention_prunes_fine_buckets_without_losing_totals(filled_store):
+    store, observations, now = filled_store
+    day = GRANULARITIES['day']
+    start, end = now - 5 * 86400, now
+
+    before = store.totals(start, end, camera_id='junction_1')
+    store.apply_retention()
+    oldest_minute = store.conn.execute(
+        "SELECT MIN(bucket_start) FROM bucket_totals WHERE granularity = 'minute'"
+    ).fetchone()[0]
+    after = assert_totals_match(store, observations, start, end, day)
+
+    assert oldest_minute >= store.bucket_start(now - RETENTION['minute'].total_seconds(), 'minute')
+    assert after['observations'] == before['observations'] == len(observations)
+
+
+def test_series_buckets_add_up_to_the_raw_frames(filled_store):
+    store, observations, now = filled_store
+    hour = GRANULARITIES['hour']
+    start = now - 30 * 3600
+
+    rows = store.series(start, now, granularity='hour', camera_id='junction_1')
+    expected = raw_totals(observations, start, now, hour)
+
+    assert sum(row['observations'] for row in rows) == expected['observations']
+    assert sum(row['avg_vehicles'] * row['observations'] for row in rows) == pytest.approx(expected['vehicle_frames'])
+    assert max(row['max_vehicles'] for row in rows) == expected['max_vehicles']
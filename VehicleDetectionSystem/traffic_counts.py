@@ -0,0 +1,127 @@
+"""
+Traffic Occupancy Rollups - Vehicle Detection System
+Per-camera, per-class traffic occupancy per minute, hour and day, answered from
+the pre-aggregated rollup store rather than the raw detections.
+
+Figures are vehicles in view per frame: the average over the frames in a bucket
+and the busiest single frame. Vehicles are not tracked between frames, so these
+are not counts of vehicles passing the camera.
+
+Examples:
+    python traffic_counts.py cameras
+    python traffic_counts.py series --camera junction_1 --last 24h
+    python traffic_counts.py series --class bus --from 2026-01-01 --to 2026-04-01 --granularity day
+    python traffic_counts.py totals --camera junction_1 --from 2026-01-01 --to 2026-04-01
+    python traffic_counts.py prune
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from utils.rollups import DEFAULT_ROLLUP_DB, GRANULARITIES, RollupStore
+
+
+UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+def parse_duration(value):
+    # "90m", "24h", "30d", "2w"
+    try:
+        return timedelta(**{UNITS[value[-1]]: float(value[:-1])})
+    except (KeyError, ValueError):
+        raise argparse.ArgumentTypeError(f"Invalid duration {value!r}, expected e.g. 90m, 24h, 30d")
+
+
+def add_range_arguments(parser):
+    parser.add_argument("--camera")
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat, help="Start (ISO date/time)")
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat, help="End, exclusive (default: now)")
+    parser.add_argument("--last", type=parse_duration, default=timedelta(days=1),
+                        help="Range ending at --to when --from is not given (default: 24h)")
+
+
+def resolve_range(args):
+    end = args.end or datetime.now()
+    start = args.start or end - args.last
+    return start, end
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Query traffic occupancy rollups (vehicles in view per frame)")
+    parser.add_argument("--db", default=str(DEFAULT_ROLLUP_DB), help=f"Path to the store (default: {DEFAULT_ROLLUP_DB})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("cameras", help="Cameras with data and the days they cover")
+
+    series = subparsers.add_parser("series", help="Avg and max vehicles per frame for each bucket in a time range")
+    add_range_arguments(series)
+    series.add_argument("--class", dest="class_name")
+    series.add_argument("--granularity", choices=list(GRANULARITIES),
+                        help="Bucket size (default: finest that fits --max-points)")
+    series.add_argument("--max-points", type=int, default=500)
+
+    totals = subparsers.add_parser("totals", help="Avg and max vehicles per frame over a time range, per class")
+    add_range_arguments(totals)
+
+    subparsers.add_parser("prune", help="Drop buckets older than their retention period")
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if not Path(args.db).exists():
+        print(f" Rollup store not found: {args.db}")
+        return 1
+
+    with RollupStore(args.db) as store:
+        start_time = time.perf_counter()
+
+        if args.command == "cameras":
+            rows = store.cameras()
+            for row in rows:
+                print(f"{row['camera_id']}  {row['first_day']:%Y-%m-%d} .. {row['last_day']:%Y-%m-%d}  "
+                      f"{row['observations']} frames  avg={row['avg_vehicles']:.2f}  max={row['max_vehicles']}")
+
+        elif args.command == "series":
+            start, end = resolve_range(args)
+            rows = store.series(
+                start, end,
+                granularity=args.granularity,
+                camera_id=args.camera,
+                class_name=args.class_name,
+                max_points=args.max_points
+            )
+            for row in rows:
+                print(f"{row['bucket_start']:%Y-%m-%d %H:%M}  frames={row['observations']:<7} "
+                      f"avg={row['avg_vehicles']:<6.2f} max={row['max_vehicles']}")
+            if rows:
+                print(f"\n Granularity: {rows[0]['granularity']}")
+                print(" avg/max: vehicles in view per frame (occupancy, not vehicles passed)")
+
+        elif args.command == "totals":
+            start, end = resolve_range(args)
+            result = store.totals(start, end, camera_id=args.camera)
+            print(f" Frames observed       : {result['observations']}")
+            print(f" Avg vehicles / frame  : {result['avg_vehicles']:.2f}")
+            print(f" Busiest frame         : {result['max_vehicles']}")
+            for class_name, occupancy in result['classes'].items():
+                print(f"   {class_name:<15} avg={occupancy['avg_vehicles']:.2f}  max={occupancy['max_vehicles']}")
+            print("\n Occupancy (vehicles in view per frame), not vehicles passed")
+
+        else:
+            deleted = store.apply_retention()
+            print(f" Removed {deleted} expired bucket(s)")
+
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        print(f"\n Answered in {elapsed_ms:.1f} ms")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,16 @@
 
-from .detector import VehicleDetector
-from .reporter import generate_report
+# Submodules are imported on first attribute access so that importing a light
+# helper (e.g. utils.reporter) does not pull in ultralytics/torch.
+_EXPORTS = {
+    'VehicleDetector': '.detector',
+    'generate_report': '.reporter',
+}
 
-__all__ = ['VehicleDetector', 'generate_report']
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        from importlib import import_module
+        return getattr(import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
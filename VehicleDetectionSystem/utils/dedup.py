@@ -0,0 +1,73 @@
+
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+
+def compute_dhash(image_path, hash_size=8):
+
+    # Decode straight to a reduced grayscale image, the hash only needs 9x8 pixels
+    image = cv2.imread(str(image_path), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+
+    # Difference hash: compare each pixel with its right-hand neighbour
+    resized = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    diff = resized[:, 1:] > resized[:, :-1]
+
+    # Pack the 64 comparison bits into a single integer
+    return int(np.packbits(diff.flatten()).view('>u8')[0])
+
+
+def _popcount64(values):
+    # Count set bits of each uint64 value
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class NearDuplicateIndex:
+
+    def __init__(self, max_distance=5, capacity=None):
+
+        self.max_distance = max_distance
+        self.capacity = capacity
+        # Representative key -> hash, oldest first so capacity evicts stale entries
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def find(self, image_hash):
+
+        if image_hash is None or not self._entries:
+            return None
+
+        keys = list(self._entries.keys())
+        hashes = np.fromiter(self._entries.values(), dtype=np.uint64, count=len(keys))
+
+        # Hamming distance to every representative at once
+        distances = _popcount64(hashes ^ np.uint64(image_hash))
+        best = int(np.argmin(distances))
+
+        if distances[best] <= self.max_distance:
+            key = keys[best]
+            self._entries.move_to_end(key)
+            return key
+        return None
+
+    def add(self, key, image_hash):
+
+        if image_hash is None:
+            return None
+
+        self._entries[key] = image_hash
+        self._entries.move_to_end(key)
+
+        # Evict the least recently matched representative
+        evicted = None
+        if self.capacity is not None and len(self._entries) > self.capacity:
+            evicted, _ = self._entries.popitem(last=False)
+        return evicted
+
@@ -1,45 +1,194 @@
 
 import os
+import threading
+import time
+import weakref
 from pathlib import Path
 import cv2
 import numpy as np
-from PIL import Image
-from ultralytics import YOLO
+
+from .dedup import NearDuplicateIndex, compute_dhash
+from .metrics import CACHE_HITS, DETECTIONS, ERRORS, IMAGES_PROCESSED, INFERENCE_LATENCY, MODEL_LOADS, QUEUE_DEPTH
+from .tuning import DEFAULT_PROFILE_PATH, apply_runtime_settings, load_profile
+
+
+# Supported image extensions
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'}
+
+# One lock per loaded model, shared by every detector using it
+_MODEL_LOCKS = weakref.WeakKeyDictionary()
+_MODEL_LOCKS_GUARD = threading.Lock()
 
 
 class VehicleDetector:
     
-    def __init__(self, model_path, confidence_threshold=0.25):
+    def __init__(self, model_path, confidence_threshold=0.25, store=None, model=None,
+                 profile_path=DEFAULT_PROFILE_PATH):
 
-        self.model = YOLO(model_path)
+        # model: an already loaded YOLO model to share, e.g. from the app's resource cache
+        if model is None:
+            model = load_model(model_path)
+        
+        self.model = model
+        self.model_lock = model_lock(model)
+        self.model_path = str(model_path)
         self.confidence_threshold = confidence_threshold
         
-    def detect(self, image_path):
+        # Inference settings; None keeps the model's own defaults
+        self.imgsz = None
+        self.batch_size = 1
+        self.profile = None
+        
+        # Also keep unrounded box coordinates under 'float_boxes' (used when scoring mAP)
+        self.float_boxes = False
+        
+        # Apply the auto-tuned profile for this host, if one was saved
+        if profile_path is not None:
+            profile = load_profile(profile_path)
+            if profile is not None:
+                self.apply_profile(profile)
+        
+        # Optional DetectionStore that every processed image is persisted to
+        self.store = store
+        self.run_id = None
+    
+    def apply_profile(self, profile):
 
+        with self.model_lock:
+            apply_runtime_settings(self.model, profile)
+        self.imgsz = profile.get('imgsz')
+        self.batch_size = max(1, int(profile.get('batch_size') or 1))
+        self.profile = profile
+    
+    def start_run(self, run_id=None):
+
+        # Begin a new run in the detection store; later results are keyed by it
+        if self.store is not None:
+            self.run_id = self.store.start_run(
+                run_id,
+                model_path=self.model_path,
+                confidence_threshold=self.confidence_threshold
+            )
+        return self.run_id
+    
+    def record(self, image_name, detections):
+
+        IMAGES_PROCESSED.inc()
+        for label, count in detections['class_counts'].items():
+            DETECTIONS.inc(count, class_name=label)
+        
+        if self.store is None:
+            return
+        if self.run_id is None:
+            self.start_run()
+        self.store.add_image(self.run_id, image_name, detections)
+        
+    def _predict_kwargs(self):
+        kwargs = {'conf': self.confidence_threshold, 'verbose': False}
+        if self.imgsz:
+            kwargs['imgsz'] = self.imgsz
+        return kwargs
+    
+    def detect(self, image, roi=None):
+
+        # image may be a path or a BGR array; roi is an optional CameraROI
+        source, offset, full_size = self._prepare_source(image, roi)
+        
         # Run inference
-        results = self.model(image_path, conf=self.confidence_threshold)[0]
+        with self.model_lock:
+            start = time.perf_counter()
+            try:
+                results = self.model(source, **self._predict_kwargs())[0]
+            except Exception:
+                ERRORS.inc(stage='inference')
+                raise
+            elapsed = time.perf_counter() - start
+        INFERENCE_LATENCY.observe(elapsed, mode='single')
+        
+        return self._apply_roi(self._parse_result(results, offset, full_size), roi)
+    
+    def detect_batch(self, images, roi=None):
+
+        if not images:
+            return []
+        
+        prepared = [self._prepare_source(image, roi) for image in images]
+        sources = [source for source, _, _ in prepared]
+        
+        # ultralytics (>=8.0.35) runs a list source as a single batch of len(list) images,
+        # so the chunk size chosen by the caller is the batch size
+        with self.model_lock:
+            start = time.perf_counter()
+            try:
+                results = self.model(sources, **self._predict_kwargs())
+            except Exception:
+                ERRORS.inc(stage='inference')
+                raise
+            elapsed = time.perf_counter() - start
+        
+        # Record the amortised per-image latency for each image in the batch
+        per_image = elapsed / len(sources)
+        for _ in sources:
+            INFERENCE_LATENCY.observe(per_image, mode='batch')
+        
+        return [
+            self._apply_roi(self._parse_result(r, offset, full_size), roi)
+            for r, (_, offset, full_size) in zip(results, prepared)
+        ]
+    
+    def _prepare_source(self, image, roi):
+
+        # Paths are always decoded here with cv2.imread, which applies the EXIF orientation
+        # like annotate_image does; ultralytics would read a path list through PIL without it
+        frame = image if isinstance(image, np.ndarray) else cv2.imread(str(image))
+        if frame is None:
+            ERRORS.inc(stage='decode')
+            raise ValueError(f"Could not read image: {image}")
+        
+        if roi is None:
+            return frame, (0, 0), None
+        
+        # Only the bounding region of the ROIs is sent to the model
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = roi.crop_region((width, height))
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f"ROIs of camera {roi.camera_id!r} lie outside the {width}x{height} frame")
+        return frame[y1:y2, x1:x2], (x1, y1), (width, height)
+    
+    def _parse_result(self, results, offset=(0, 0), image_size=None):
+
+        offset_x, offset_y = offset
         
         # Parse results
         detections = {
             'boxes': [],
             'labels': [],
             'confidences': [],
-            'class_counts': {}
+            'class_counts': {},
+            'image_size': image_size or (results.orig_shape[1], results.orig_shape[0])
         }
+        if self.float_boxes:
+            detections['float_boxes'] = []
         
         if len(results.boxes) > 0:
-            for box in results.boxes:
-                # Get box coordinates
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                
-                # Get confidence and class
-                conf = float(box.conf[0].cpu().numpy())
-                cls = int(box.cls[0].cpu().numpy())
-                label = results.names[cls]
+            # Move all boxes off the device at once
+            boxes = results.boxes.xyxy.cpu().numpy()
+            confs = results.boxes.conf.cpu().numpy()
+            classes = results.boxes.cls.cpu().numpy()
+            
+            for (x1, y1, x2, y2), conf, cls in zip(boxes, confs, classes):
+                label = results.names[int(cls)]
                 
-                detections['boxes'].append([int(x1), int(y1), int(x2), int(y2)])
+                # Boxes from a cropped region are shifted back to full-frame coordinates
+                detections['boxes'].append([
+                    int(x1) + offset_x, int(y1) + offset_y, int(x2) + offset_x, int(y2) + offset_y
+                ])
+                if self.float_boxes:
+                    detections['float_boxes'].append([
+                        float(x1) + offset_x, float(y1) + offset_y, float(x2) + offset_x, float(y2) + offset_y
+                    ])
                 detections['labels'].append(label)
-                detections['confidences'].append(conf)
+                detections['confidences'].append(float(conf))
                 
                 # Update class counts
                 if label in detections['class_counts']:
@@ -49,11 +198,53 @@ class VehicleDetector:
         
         return detections
     
+    def _apply_roi(self, detections, roi):
+
+        if roi is None:
+            return detections
+        
+        # Drop detections outside every polygon and count the rest per ROI
+        assigned = roi.assign(detections['boxes'])
+        filtered = {
+            'boxes': [],
+            'labels': [],
+            'confidences': [],
+            'class_counts': {},
+            'image_size': detections['image_size'],
+            'roi_counts': {name: {} for name in roi.polygons},
+            'camera_id': roi.camera_id
+        }
+        
+        for box, label, conf, roi_name in zip(
+                detections['boxes'], detections['labels'], detections['confidences'], assigned):
+            if roi_name is None:
+                continue
+            
+            filtered['boxes'].append(box)
+            filtered['labels'].append(label)
+            filtered['confidences'].append(conf)
+            filtered['class_counts'][label] = filtered['class_counts'].get(label, 0) + 1
+            
+            roi_counts = filtered['roi_counts'][roi_name]
+            roi_counts[label] = roi_counts.get(label, 0) + 1
+        
+        return filtered
+    
     def annotate_image(self, image_path, detections, output_path):
 
         # Load image
         image = cv2.imread(str(image_path))
         
+        self.draw_detections(image, detections)
+        
+        # Save annotated image
+        cv2.imwrite(str(output_path), image)
+        return str(output_path)
+    
+    def draw_detections(self, image, detections):
+
+        # Draw boxes and labels onto a BGR image in place
+        
         # Define colors for all 8 classes in the dataset
         # Colors in BGR format (OpenCV uses BGR)
         colors = {
@@ -106,17 +297,15 @@ class VehicleDetector:
                 2
             )
         
-        # Save annotated image
-        cv2.imwrite(str(output_path), image)
-        return str(output_path)
+        return image
     
-    def process_single_image(self, image_path, output_dir):
+    def process_single_image(self, image_path, output_dir, roi=None):
 
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         
         # Run detection
-        detections = self.detect(image_path)
+        detections = self.detect(image_path, roi=roi)
         
         # Generate output filename
         filename = Path(image_path).name
@@ -125,56 +314,203 @@ class VehicleDetector:
         # Annotate image
         annotated_path = self.annotate_image(image_path, detections, output_path)
         
+        self.record(filename, detections)
+        if self.store is not None:
+            self.store.commit()
+        
         return annotated_path, detections
     
-    def process_folder(self, folder_path, output_dir, organize_by_class=True):
+    def process_folder(self, folder_path, output_dir, organize_by_class=True, dedup_distance=None,
+                       recursive=False, shard_size=None, roi=None, sort_by_name=True):
+
+        # Collect every result; use iter_folder directly for large folders. Every result is
+        # held in memory anyway, so images are processed in name order by default.
+        return list(self.iter_folder(
+            folder_path,
+            output_dir,
+            organize_by_class=organize_by_class,
+            dedup_distance=dedup_distance,
+            recursive=recursive,
+            shard_size=shard_size,
+            roi=roi,
+            sort_by_name=sort_by_name
+        ))
+    
+    def iter_folder(self, folder_path, output_dir, organize_by_class=True, dedup_distance=None,
+                    recursive=False, shard_size=None, dedup_capacity=256, roi=None, sort_by_name=False):
+
+        # shard_size: at most this many files per output folder (<class>/0000/, 0001/, ...);
+        # None writes straight into <class>/. sort_by_name: see iter_image_files.
 
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
         
-        # Supported image extensions
-        image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'}
+        # Near-duplicates are matched against a bounded set of recent representatives,
+        # which keeps memory constant while still catching runs of similar frames
+        index = None
+        if dedup_distance is not None:
+            index = NearDuplicateIndex(max_distance=dedup_distance, capacity=dedup_capacity)
         
-        # Get all image files
-        image_files = [
-            f for f in Path(folder_path).iterdir()
-            if f.suffix.lower() in image_extensions
-        ]
+        # Files written so far per output folder, used to pick the current shard
+        written_counts = {}
         
-        results = []
+        try:
+            image_paths = iter_image_files(folder_path, recursive=recursive, sort_by_name=sort_by_name)
+            for image_path, image_name, detections, duplicate_of in self._iter_detections(
+                    image_paths, folder_path, index, roi):
+                
+                # Determine dominant class
+                dominant_class = 'unknown'
+                if detections['class_counts']:
+                    # Get class with highest count
+                    dominant_class = max(
+                        detections['class_counts'].items(),
+                        key=lambda x: x[1]
+                    )[0]
+                
+                # Determine output path, sharded so no folder grows without bound
+                target_dir = Path(output_dir) / dominant_class if organize_by_class else Path(output_dir)
+                if shard_size:
+                    count = written_counts.get(target_dir, 0)
+                    written_counts[target_dir] = count + 1
+                    target_dir = target_dir / f"{count // shard_size:04d}"
+                os.makedirs(target_dir, exist_ok=True)
+                output_path = target_dir / f"annotated_{image_name.replace('/', '__')}"
+                
+                # Annotate image
+                try:
+                    annotated_path = self.annotate_image(str(image_path), detections, output_path)
+                except Exception:
+                    ERRORS.inc(stage='annotate')
+                    raise
+                
+                self.record(image_name, detections)
+                QUEUE_DEPTH.dec()
+                
+                yield {
+                    'image_name': image_name,
+                    'annotated_path': annotated_path,
+                    'detections': detections,
+                    'dominant_class': dominant_class,
+                    'total_vehicles': len(detections['labels']),
+                    'avg_confidence': np.mean(detections['confidences']) if detections['confidences'] else 0,
+                    'duplicate_of': duplicate_of
+                }
+        finally:
+            QUEUE_DEPTH.set(0)
+            if self.store is not None:
+                self.store.commit()
+    
+    def _iter_detections(self, image_paths, folder_path, index=None, roi=None, max_pending=None):
+
+        # Yield (image_path, image_name, detections, duplicate_of) in file order. Images are
+        # hashed before they are batched, so every model call gets batch_size representatives
+        # however the near-duplicates fall; duplicates wait for their representative's batch.
+        # max_pending bounds how many images can queue up behind a partly filled batch.
+        max_pending = max_pending or self.batch_size * 64
+        representative_detections = {}
+        pending = []
+        to_infer = []
         
-        for image_path in image_files:
-            # Run detection
-            detections = self.detect(str(image_path))
+        for image_path in image_paths:
+            image_name = image_path.relative_to(folder_path).as_posix()
+            duplicate_of = None
+            if index is not None:
+                image_hash = compute_dhash(image_path)
+                duplicate_of = index.find(image_hash)
+                if duplicate_of is None:
+                    index.add(image_name, image_hash)
             
-            # Determine dominant class
-            dominant_class = 'unknown'
-            if detections['class_counts']:
-                # Get class with highest count
-                dominant_class = max(
-                    detections['class_counts'].items(),
-                    key=lambda x: x[1]
-                )[0]
+            if duplicate_of is None:
+                to_infer.append(len(pending))
+            pending.append((image_path, image_name, duplicate_of))
             
-            # Determine output path
-            if organize_by_class:
-                class_dir = Path(output_dir) / dominant_class
-                os.makedirs(class_dir, exist_ok=True)
-                output_path = class_dir / f"annotated_{image_path.name}"
+            if len(to_infer) >= self.batch_size or len(pending) >= max_pending:
+                yield from self._infer_pending(pending, to_infer, roi, index, representative_detections)
+                
+                # Forget evicted representatives (and any unreadable image) once they are used;
+                # only names still in the index can be matched again
+                for name in [name for name in representative_detections if name not in index]:
+                    representative_detections.pop(name)
+                pending, to_infer = [], []
+        
+        if pending:
+            yield from self._infer_pending(pending, to_infer, roi, index, representative_detections)
+    
+    def _infer_pending(self, pending, to_infer, roi, index, representative_detections):
+
+        QUEUE_DEPTH.set(len(pending))
+        
+        # Run detection on every representative at once
+        inferred = dict(zip(to_infer, self.detect_batch([pending[i][0] for i in to_infer], roi=roi)))
+        
+        for i, (image_path, image_name, duplicate_of) in enumerate(pending):
+            if duplicate_of is None:
+                detections = inferred[i]
+                if index is not None:
+                    representative_detections[image_name] = detections
             else:
-                output_path = Path(output_dir) / f"annotated_{image_path.name}"
-            
-            # Annotate image
-            annotated_path = self.annotate_image(str(image_path), detections, output_path)
-            
-            # Store results
-            results.append({
-                'image_name': image_path.name,
-                'annotated_path': annotated_path,
-                'detections': detections,
-                'dominant_class': dominant_class,
-                'total_vehicles': len(detections['labels']),
-                'avg_confidence': np.mean(detections['confidences']) if detections['confidences'] else 0
-            })
-        
-        return results
+                # Inherit detections from the group representative
+                detections = representative_detections[duplicate_of]
+                CACHE_HITS.inc(cache='dedup')
+            yield image_path, image_name, detections, duplicate_of
+
+
+def load_model(model_path):
+
+    # ultralytics/torch are only imported here, when a model is actually needed
+    from ultralytics import YOLO
+
+    model = YOLO(str(model_path))
+    MODEL_LOADS.inc()
+    return model
+
+
+def model_lock(model):
+
+    # ultralytics predictors keep per-call state (args, imgsz, batch buffers) and are not
+    # thread-safe, while the app shares one loaded model between sessions; every call into
+    # a model goes through its lock
+    with _MODEL_LOCKS_GUARD:
+        lock = _MODEL_LOCKS.get(model)
+        if lock is None:
+            lock = _MODEL_LOCKS[model] = threading.Lock()
+        return lock
+
+
+def iter_chunks(iterable, size):
+
+    # Yield lists of up to size items without materialising the iterable
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_image_files(folder_path, recursive=False, sort_by_name=False):
+
+    # Stream one directory at a time so huge folders are never listed into memory. The
+    # order is then whatever the filesystem returns, which is not deterministic. With
+    # sort_by_name each directory's listing is read and sorted first: results are
+    # reproducible and consecutive frames stay together for the near-duplicate index,
+    # at the cost of holding that listing in memory.
+    pending = [str(folder_path)]
+    
+    while pending:
+        directory = pending.pop()
+        subdirs = []
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name) if sort_by_name else it
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                    yield Path(entry.path)
+        
+        # Reversed onto the stack so sub-folders are visited in listing order
+        if recursive:
+            pending.extend(reversed(subdirs))
@@ -0,0 +1,193 @@
+
+from pathlib import Path
+import numpy as np
+
+
+# IoU thresholds 0.50:0.95, as in COCO / ultralytics val
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+
+def label_path_for(image_path):
+
+    # YOLO layout: .../images/name.jpg -> .../labels/name.txt
+    image_path = Path(image_path)
+    parts = list(image_path.parts)
+    for i in range(len(parts) - 1, -1, -1):
+        if parts[i] == 'images':
+            parts[i] = 'labels'
+            return Path(*parts).with_suffix('.txt')
+    return image_path.with_suffix('.txt')
+
+
+def load_yolo_labels(label_path, image_size):
+
+    # Returns (classes (M,), boxes (M, 4) xyxy in pixels); a missing file means no objects
+    width, height = image_size
+    label_path = Path(label_path)
+    if not label_path.exists() or label_path.stat().st_size == 0:
+        return np.zeros(0, dtype=int), np.zeros((0, 4), dtype=np.float32)
+
+    data = np.loadtxt(label_path, ndmin=2, dtype=np.float32)
+    if data.size == 0:
+        return np.zeros(0, dtype=int), np.zeros((0, 4), dtype=np.float32)
+
+    classes = data[:, 0].astype(int)
+    xc, yc, w, h = data[:, 1] * width, data[:, 2] * height, data[:, 3] * width, data[:, 4] * height
+    boxes = np.stack([xc - w / 2, yc - h / 2, xc + w / 2, yc + h / 2], axis=1)
+    return classes, boxes
+
+
+def box_iou(boxes_a, boxes_b):
+
+    # Pairwise IoU of (N, 4) and (M, 4) xyxy boxes -> (N, M)
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+
+    return intersection / np.maximum(union, 1e-9)
+
+
+def match_predictions(pred_classes, pred_boxes, gt_classes, gt_boxes, iou_thresholds=IOU_THRESHOLDS):
+
+    # (N, T) bool matrix: is prediction n a true positive at IoU threshold t.
+    # Each prediction takes its highest-IoU ground truth, and each ground truth is matched
+    # at most once, by the earliest such prediction. Detections arrive sorted by
+    # confidence, so this is the higher-confidence-first rule ultralytics val uses.
+    correct = np.zeros((len(pred_classes), len(iou_thresholds)), dtype=bool)
+    if len(pred_classes) == 0 or len(gt_classes) == 0:
+        return correct
+
+    iou = box_iou(gt_boxes, pred_boxes)
+    iou = iou * (gt_classes[:, None] == pred_classes[None, :])
+
+    for t, threshold in enumerate(iou_thresholds):
+        gt_idx, pred_idx = np.nonzero(iou >= threshold)
+        if len(gt_idx) == 0:
+            continue
+
+        order = np.argsort(-iou[gt_idx, pred_idx], kind='stable')
+        gt_idx, pred_idx = gt_idx[order], pred_idx[order]
+
+        # Greedy one-to-one assignment via first occurrence on each side
+        _, keep = np.unique(pred_idx, return_index=True)
+        gt_idx, pred_idx = gt_idx[keep], pred_idx[keep]
+        _, keep = np.unique(gt_idx, return_index=True)
+        correct[pred_idx[keep], t] = True
+
+    return correct
+
+
+def _average_precision(recall, precision):
+
+    # Same as ultralytics' compute_ap (used by model.val()): the precision envelope sampled
+    # at 101 recall points and integrated with the trapezoid rule, so numbers line up
+    recall = np.concatenate([[0.0], recall, [1.0]])
+    precision = np.concatenate([[1.0], precision, [0.0]])
+    precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+
+    points = np.linspace(0, 1, 101)
+    curve = np.interp(points, recall, precision)
+    return float(((curve[1:] + curve[:-1]) / 2 * np.diff(points)).sum())
+
+
+def compute_metrics(correct, confidences, pred_classes, gt_classes, class_names, serving_conf=0.25):
+
+    # Per-class precision/recall at the serving threshold plus AP50 and AP50-95
+    correct = np.asarray(correct, dtype=bool).reshape(-1, len(IOU_THRESHOLDS))
+    confidences = np.asarray(confidences, dtype=np.float32)
+    pred_classes = np.asarray(pred_classes, dtype=int)
+    gt_classes = np.asarray(gt_classes, dtype=int)
+
+    order = np.argsort(-confidences, kind='stable')
+    correct, confidences, pred_classes = correct[order], confidences[order], pred_classes[order]
+
+    per_class = {}
+    for class_id, class_name in class_names.items():
+        is_class = pred_classes == class_id
+        n_gt = int((gt_classes == class_id).sum())
+        n_pred = int(is_class.sum())
+
+        if n_gt == 0 and n_pred == 0:
+            continue
+
+        tp = correct[is_class]
+        tp_cumsum = tp.cumsum(axis=0)
+        fp_cumsum = (~tp).cumsum(axis=0)
+
+        recall_curve = tp_cumsum / max(n_gt, 1)
+        precision_curve = tp_cumsum / np.maximum(tp_cumsum + fp_cumsum, 1)
+
+        ap = np.zeros(len(IOU_THRESHOLDS))
+        if n_gt > 0 and n_pred > 0:
+            for t in range(len(IOU_THRESHOLDS)):
+                ap[t] = _average_precision(recall_curve[:, t], precision_curve[:, t])
+
+        # Operating point: predictions the app would actually show
+        served = confidences[is_class] >= serving_conf
+        served_tp = int(tp[served, 0].sum())
+        served_count = int(served.sum())
+
+        per_class[class_name] = {
+            'instances': n_gt,
+            'precision': served_tp / served_count if served_count else 0.0,
+            'recall': served_tp / n_gt if n_gt else 0.0,
+            'map50': float(ap[0]),
+            'map50_95': float(ap.mean()),
+        }
+
+    evaluated = [m for m in per_class.values() if m['instances'] > 0]
+    overall = {
+        'precision': float(np.mean([m['precision'] for m in evaluated])) if evaluated else 0.0,
+        'recall': float(np.mean([m['recall'] for m in evaluated])) if evaluated else 0.0,
+        'map50': float(np.mean([m['map50'] for m in evaluated])) if evaluated else 0.0,
+        'map50_95': float(np.mean([m['map50_95'] for m in evaluated])) if evaluated else 0.0,
+    }
+
+    return {'classes': per_class, 'overall': overall}
+
+
+class EvaluationAccumulator:
+
+    def __init__(self, class_names):
+
+        # class_names: {class_id: name}, normally the model's names
+        self.class_names = dict(class_names)
+        self._ids_by_name = {name: class_id for class_id, name in self.class_names.items()}
+        self._correct = []
+        self._confidences = []
+        self._pred_classes = []
+        self._gt_classes = []
+        self.images = 0
+
+    def add(self, detections, gt_classes, gt_boxes):
+
+        pred_classes = np.array([self._ids_by_name.get(label, -1) for label in detections['labels']], dtype=int)
+        # Integer boxes cost high-IoU matches on small objects, so unrounded ones are preferred
+        pred_boxes = np.asarray(detections.get('float_boxes', detections['boxes']), dtype=np.float32).reshape(-1, 4)
+
+        self._correct.append(match_predictions(pred_classes, pred_boxes, gt_classes, gt_boxes))
+        self._confidences.append(np.asarray(detections['confidences'], dtype=np.float32))
+        self._pred_classes.append(pred_classes)
+        self._gt_classes.append(np.asarray(gt_classes, dtype=int))
+        self.images += 1
+
+    def compute(self, serving_conf=0.25):
+
+        if not self.images:
+            return {'classes': {}, 'overall': {'precision': 0.0, 'recall': 0.0, 'map50': 0.0, 'map50_95': 0.0}}
+
+        return compute_metrics(
+            np.concatenate(self._correct),
+            np.concatenate(self._confidences),
+            np.concatenate(self._pred_classes),
+            np.concatenate(self._gt_classes),
+            self.class_names,
+            serving_conf=serving_conf
+        )
@@ -0,0 +1,204 @@
+
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import cv2
+
+from .video import open_capture
+
+
+# Highest quality first. A level may name a smaller model file; such levels are
+# only used when that file exists.
+DEFAULT_QUALITY_LEVELS = [
+    {'name': 'Full', 'imgsz': 640, 'frame_skip': 0, 'model_path': None},
+    {'name': 'High', 'imgsz': 512, 'frame_skip': 0, 'model_path': None},
+    {'name': 'Medium', 'imgsz': 416, 'frame_skip': 0, 'model_path': None},
+    {'name': 'Low', 'imgsz': 320, 'frame_skip': 0, 'model_path': None},
+    {'name': 'Low, skip 1', 'imgsz': 320, 'frame_skip': 1, 'model_path': None},
+    {'name': 'Low, skip 2', 'imgsz': 320, 'frame_skip': 2, 'model_path': None},
+    {'name': 'Small model', 'imgsz': 320, 'frame_skip': 2, 'model_path': 'models/best_small.pt'},
+    {'name': 'Small model, skip 4', 'imgsz': 256, 'frame_skip': 4, 'model_path': 'models/best_small.pt'},
+]
+
+
+def available_quality_levels(levels=DEFAULT_QUALITY_LEVELS):
+    return [level for level in levels if level['model_path'] is None or Path(level['model_path']).exists()]
+
+
+class LatestFrameReader:
+
+    def __init__(self, source):
+
+        # A background thread keeps only the newest frame, so a slow consumer
+        # drops stale frames instead of building a backlog
+        self.source = source
+        self._capture = open_capture(source)
+        self._lock = threading.Lock()
+        self._frame = None
+        self._frame_id = 0
+        self._stopped = threading.Event()
+        self.finished = False
+        self._thread = threading.Thread(target=self._run, name="live-frame-reader", daemon=True)
+
+        # Cameras and streams deliver frames in real time; a file would otherwise be read
+        # as fast as it decodes, so it is paced to its own frame rate
+        fps = self._capture.get(cv2.CAP_PROP_FPS) if os.path.isfile(str(source)) else 0
+        self._frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        next_due = time.perf_counter()
+        while not self._stopped.is_set():
+            ok, frame = self._capture.read()
+            if not ok:
+                self.finished = True
+                break
+            with self._lock:
+                self._frame = frame
+                self._frame_id += 1
+
+            if self._frame_interval:
+                next_due += self._frame_interval
+                delay = next_due - time.perf_counter()
+                if delay > 0:
+                    self._stopped.wait(delay)
+                else:
+                    # Decoding fell behind; carry on from now rather than bursting to catch up
+                    next_due = time.perf_counter()
+        self._capture.release()
+
+    def latest(self):
+        with self._lock:
+            return self._frame_id, self._frame
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join(timeout=2)
+
+
+class AdaptiveController:
+
+    def __init__(self, target_fps, levels, patience=5, upgrade_patience=30, headroom=0.6):
+
+        # patience: consecutive slow frames before lowering quality
+        # upgrade_patience: consecutive fast frames (below headroom * budget) before raising it
+        self.budget = 1.0 / target_fps
+        self.levels = levels
+        self.patience = patience
+        self.upgrade_patience = upgrade_patience
+        self.headroom = headroom
+        self.index = 0
+        self._slow = 0
+        self._fast = 0
+        self._ema = None
+
+    @property
+    def level(self):
+        return self.levels[self.index]
+
+    def update(self, frame_seconds):
+
+        # Smooth the per-frame processing time, then step quality down or up
+        self._ema = frame_seconds if self._ema is None else 0.8 * self._ema + 0.2 * frame_seconds
+
+        if self._ema > self.budget:
+            self._slow += 1
+            self._fast = 0
+        elif self._ema < self.budget * self.headroom:
+            self._fast += 1
+            self._slow = 0
+        else:
+            self._slow = self._fast = 0
+
+        if self._slow >= self.patience and self.index < len(self.levels) - 1:
+            self._change(self.index + 1)
+        elif self._fast >= self.upgrade_patience and self.index > 0:
+            self._change(self.index - 1)
+
+        return self.level
+
+    def _change(self, index):
+        self.index = index
+        self._slow = self._fast = 0
+        # Timings from the old level say nothing about the new one
+        self._ema = None
+
+
+class FpsMeter:
+
+    def __init__(self, window=30):
+        self._times = deque(maxlen=window)
+
+    def tick(self):
+        self._times.append(time.perf_counter())
+
+    @property
+    def fps(self):
+        if len(self._times) < 2:
+            return 0.0
+        return (len(self._times) - 1) / (self._times[-1] - self._times[0])
+
+
+class LivePipeline:
+
+    def __init__(self, reader, controller, get_detector, roi=None):
+
+        # get_detector(model_path) returns a VehicleDetector; None means the default model
+        self.reader = reader
+        self.controller = controller
+        self.get_detector = get_detector
+        self.roi = roi
+        self.meter = FpsMeter()
+        self._last_frame_id = 0
+        self._last_detections = None
+        self._since_inference = 0
+        self._step_start = None
+
+    def step(self):
+
+        # Process the newest frame; returns None when no new frame has arrived
+        frame_id, frame = self.reader.latest()
+        if frame is None or frame_id == self._last_frame_id:
+            return None
+
+        dropped = max(0, frame_id - self._last_frame_id - 1)
+        self._last_frame_id = frame_id
+
+        self._step_start = time.perf_counter()
+        level = self.controller.level
+        detector = self.get_detector(level['model_path'])
+
+        inferred = False
+        if self._last_detections is None or self._since_inference >= level['frame_skip']:
+            detector.imgsz = level['imgsz']
+            self._last_detections = detector.detect(frame, roi=self.roi)
+            self._since_inference = 0
+            inferred = True
+        else:
+            self._since_inference += 1
+
+        annotated = detector.draw_detections(frame.copy(), self._last_detections)
+        self.meter.tick()
+
+        return annotated, {
+            'fps': self.meter.fps,
+            'level_index': self.controller.index,
+            'level': level,
+            'inferred': inferred,
+            'dropped_frames': dropped,
+            'detections': self._last_detections,
+        }
+
+    def finish_frame(self):
+
+        # Call once the frame returned by step() has been displayed. The controller is fed
+        # the whole iteration (detect, draw, display, stats), since all of it must fit the budget
+        if self._step_start is not None:
+            self.controller.update(time.perf_counter() - self._step_start)
+            self._step_start = None
@@ -0,0 +1,310 @@
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @property
+    def family_name(self):
+        # Name used on the # HELP / # TYPE lines
+        return self.name
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+
+    kind = "counter"
+
+    @property
+    def family_name(self):
+        # prometheus_client names a counter family after its _total sample
+        return self.name + "_total"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0)]
+        return [(self.family_name, key, (), value) for key, value in items]
+
+
+class Gauge(_Metric):
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, function=None):
+        # function, if given, is called at collection time for unlabelled gauges
+        self._function = function
+        super().__init__(name, documentation, labelnames, registry)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        if self._function is not None:
+            return [(self.name, (), (), self._function())]
+        with self._lock:
+            items = list(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0)]
+        return [(self.name, key, (), value) for key, value in items]
+
+
+class Histogram(_Metric):
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def quantile(self, q, **labels):
+
+        # Estimate from bucket counts, interpolating linearly inside the bucket
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if not state or not state[2]:
+                return None
+            counts, _, total = list(state[0]), state[1], state[2]
+
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, counts):
+            if cumulative + count >= rank and count:
+                if bound == float("inf"):
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound if bound != float("inf") else lower
+        return lower
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+
+        samples = []
+        for key, (counts, total_sum, total_count) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((self.name + "_bucket", key, (("le", _format_value(bound)),), cumulative))
+            samples.append((self.name + "_sum", key, (), total_sum))
+            samples.append((self.name + "_count", key, (), total_count))
+        return samples
+
+
+class _Timer:
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+
+        # Prometheus text exposition format 0.0.4
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.family_name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.family_name} {metric.kind}")
+            for sample_name, key, extra, value in metric.samples():
+                labels = _format_labels(metric.labelnames, key, extra)
+                lines.append(f"{sample_name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_to_file(self, path):
+
+        # Atomic replace so scrapers (e.g. node_exporter textfile) never see partial output
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+REGISTRY = Registry()
+
+
+def process_rss_bytes():
+
+    # Current resident set size; /proc on Linux, peak RSS elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return 0
+
+
+# Metrics shared by the detector, batch paths and the app
+IMAGES_PROCESSED = Counter("neurodrive_images_processed", "Images that produced a result")
+DETECTIONS = Counter("neurodrive_detections", "Detected vehicles by class", ["class_name"])
+CACHE_HITS = Counter("neurodrive_cache_hits", "Work avoided by a cache", ["cache"])
+ERRORS = Counter("neurodrive_errors", "Failures by stage", ["stage"])
+INFERENCE_LATENCY = Histogram(
+    "neurodrive_inference_seconds", "Model inference wall time per image", ["mode"]
+)
+QUEUE_DEPTH = Gauge("neurodrive_queue_depth", "Images read but not yet processed")
+MODEL_LOADS = Counter("neurodrive_model_loads", "Models loaded by this process")
+PROCESS_RSS = Gauge("neurodrive_process_rss_bytes", "Resident set size of this process", function=process_rss_bytes)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the console
+        pass
+
+
+def start_http_server(port=9108, host="127.0.0.1", registry=REGISTRY):
+
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    return server
+
+
+def start_file_writer(path, interval=15.0, registry=REGISTRY):
+
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            try:
+                registry.write_to_file(path)
+            except OSError:
+                ERRORS.inc(stage="metrics_file")
+            stop.wait(interval)
+
+    threading.Thread(target=run, name="metrics-file", daemon=True).start()
+    return stop
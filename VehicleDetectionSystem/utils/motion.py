@@ -0,0 +1,123 @@
+
+import time
+import cv2
+import numpy as np
+
+from .metrics import CACHE_HITS
+
+
+class MotionGate:
+
+    def __init__(self, threshold=0.005, pixel_delta=25, width=160, max_skip=None, region=None):
+
+        # threshold: fraction of downscaled pixels that must change to count as motion
+        # pixel_delta: grey-level difference for a pixel to count as changed
+        # max_skip: force inference after this many consecutive skipped frames
+        # region: optional (x1, y1, x2, y2) so only e.g. the ROI crop is watched
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.width = width
+        self.max_skip = max_skip
+        self.region = region
+        self._reference = None
+        self._skipped_in_row = 0
+        self.last_change = 0.0
+
+    def _thumbnail(self, frame):
+        if self.region is not None:
+            x1, y1, x2, y2 = self.region
+            frame = frame[max(0, y1):y2, max(0, x1):x2]
+
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        # Blur away sensor noise and compression artefacts
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def check(self, frame):
+
+        # True when the scene changed enough to need fresh inference
+        thumbnail = self._thumbnail(frame)
+
+        if self._reference is None or thumbnail.shape != self._reference.shape:
+            self._reference = thumbnail
+            self._skipped_in_row = 0
+            self.last_change = 1.0
+            return True
+
+        # Compare against the frame inference last ran on, so slow drift still adds up
+        diff = cv2.absdiff(thumbnail, self._reference)
+        self.last_change = float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+
+        forced = self.max_skip is not None and self._skipped_in_row >= self.max_skip
+        if self.last_change >= self.threshold or forced:
+            self._reference = thumbnail
+            self._skipped_in_row = 0
+            return True
+
+        self._skipped_in_row += 1
+        return False
+
+    def reset(self):
+        self._reference = None
+        self._skipped_in_row = 0
+
+
+class GatedDetector:
+
+    def __init__(self, detector, gate=None, roi=None):
+
+        self.detector = detector
+        self.roi = roi
+        if gate is None:
+            gate = MotionGate(region=roi.bounds if roi is not None else None)
+        self.gate = gate
+        self._last_detections = None
+
+        self.frames = 0
+        self.inferred = 0
+        self.skipped = 0
+        self.inference_seconds = 0.0
+        self.gate_seconds = 0.0
+
+    def detect(self, frame):
+
+        # Returns (detections, reused); reused is True when inference was skipped
+        self.frames += 1
+
+        start = time.perf_counter()
+        changed = self.gate.check(frame) or self._last_detections is None
+        self.gate_seconds += time.perf_counter() - start
+
+        if not changed:
+            self.skipped += 1
+            CACHE_HITS.inc(cache='motion')
+            return self._last_detections, True
+
+        start = time.perf_counter()
+        detections = self.detector.detect(frame, roi=self.roi)
+        self.inference_seconds += time.perf_counter() - start
+        self.inferred += 1
+
+        self._last_detections = detections
+        return detections, False
+
+    def stats(self):
+
+        avg_inference = self.inference_seconds / self.inferred if self.inferred else 0.0
+        saved = self.skipped * avg_inference
+
+        return {
+            'frames': self.frames,
+            'inferred_frames': self.inferred,
+            'skipped_frames': self.skipped,
+            'skipped_ratio': self.skipped / self.frames if self.frames else 0.0,
+            'avg_inference_seconds': avg_inference,
+            'inference_seconds': self.inference_seconds,
+            'gate_seconds': self.gate_seconds,
+            # Estimated inference time avoided, net of the gate's own cost
+            'compute_saved_seconds': max(0.0, saved - self.gate_seconds),
+        }
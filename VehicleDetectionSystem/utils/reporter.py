@@ -14,12 +14,17 @@ def generate_report(results, output_path):
             'Total Vehicles': result['total_vehicles'],
             'Dominant Class': result['dominant_class'],
             'Average Confidence': f"{result['avg_confidence']:.2%}",
+            'Deduplicated Against': result.get('duplicate_of') or '',
         }
         
         # Add per-class counts
         for class_name, count in result['detections']['class_counts'].items():
             row[f'{class_name.capitalize()} Count'] = count
         
+        # Add per-ROI vehicle totals when a camera ROI was applied
+        for roi_name, counts in result['detections'].get('roi_counts', {}).items():
+            row[f'ROI {roi_name} Count'] = sum(counts.values())
+        
         report_data.append(row)
     
     # Create DataFrame
@@ -37,32 +42,41 @@ def generate_report(results, output_path):
 
 def generate_summary_stats(results):
 
-    if not results:
-        return {
-            'total_images': 0,
-            'total_vehicles': 0,
-            'avg_confidence': 0,
-            'class_distribution': {}
-        }
-    
-    total_vehicles = sum(r['total_vehicles'] for r in results)
-    all_confidences = []
+    # Single pass with running totals so results may be a lazy iterator
+    total_images = 0
+    total_vehicles = 0
+    confidence_sum = 0.0
+    confidence_count = 0
+    deduplicated_images = 0
     class_distribution = {}
+    roi_distribution = {}
     
     for result in results:
-        all_confidences.extend(result['detections']['confidences'])
+        total_images += 1
+        total_vehicles += result['total_vehicles']
+        confidence_sum += sum(result['detections']['confidences'])
+        confidence_count += len(result['detections']['confidences'])
+        if result.get('duplicate_of'):
+            deduplicated_images += 1
         
         for class_name, count in result['detections']['class_counts'].items():
             if class_name in class_distribution:
                 class_distribution[class_name] += count
             else:
                 class_distribution[class_name] = count
+        
+        for roi_name, counts in result['detections'].get('roi_counts', {}).items():
+            roi_totals = roi_distribution.setdefault(roi_name, {})
+            for class_name, count in counts.items():
+                roi_totals[class_name] = roi_totals.get(class_name, 0) + count
     
-    avg_confidence = sum(all_confidences) / len(all_confidences) if all_confidences else 0
+    avg_confidence = confidence_sum / confidence_count if confidence_count else 0
     
     return {
-        'total_images': len(results),
+        'total_images': total_images,
         'total_vehicles': total_vehicles,
         'avg_confidence': avg_confidence,
-        'class_distribution': class_distribution
+        'class_distribution': class_distribution,
+        'deduplicated_images': deduplicated_images,
+        'roi_distribution': roi_distribution
     }
@@ -0,0 +1,81 @@
+
+import json
+from pathlib import Path
+import numpy as np
+
+
+DEFAULT_ROI_CONFIG = Path("config/roi.json")
+
+
+class CameraROI:
+
+    def __init__(self, camera_id, rois, padding=16):
+
+        # rois: {name: [[x, y], ...]} polygons in full-frame pixel coordinates
+        if not rois:
+            raise ValueError(f"Camera {camera_id!r} has no ROI polygons")
+
+        self.camera_id = camera_id
+        self.polygons = {}
+        for name, points in rois.items():
+            polygon = np.asarray(points, dtype=np.float32)
+            if polygon.ndim != 2 or polygon.shape[1] != 2 or len(polygon) < 3:
+                raise ValueError(f"ROI {camera_id}/{name} must be a list of at least 3 [x, y] points")
+            self.polygons[name] = polygon
+
+        # Union bounding box of all polygons, padded so boxes crossing the edge keep context
+        all_points = np.concatenate(list(self.polygons.values()))
+        x1, y1 = np.floor(all_points.min(axis=0)).astype(int) - padding
+        x2, y2 = np.ceil(all_points.max(axis=0)).astype(int) + padding
+        self.bounds = (int(x1), int(y1), int(x2), int(y2))
+
+    def crop_region(self, image_size):
+
+        # Bounding region clipped to the frame, as (x1, y1, x2, y2)
+        width, height = image_size
+        x1, y1, x2, y2 = self.bounds
+        return max(0, x1), max(0, y1), min(width, x2), min(height, y2)
+
+    def assign(self, boxes):
+
+        # ROI name for each box, or None when its ground point lies outside every polygon.
+        # The bottom-centre of a box is where the vehicle touches the road.
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        points = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1)
+
+        assigned = [None] * len(boxes)
+        for name, polygon in self.polygons.items():
+            inside = points_in_polygon(points, polygon)
+            for i in np.nonzero(inside)[0]:
+                if assigned[i] is None:
+                    assigned[i] = name
+        return assigned
+
+
+def points_in_polygon(points, polygon):
+
+    # Vectorised even-odd ray casting: (N, 2) points against one (K, 2) polygon
+    x, y = points[:, 0:1], points[:, 1:2]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+    crosses = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_intersect = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return np.logical_and(crosses, x < x_intersect).sum(axis=1) % 2 == 1
+
+
+def load_roi_config(config_path=DEFAULT_ROI_CONFIG):
+
+    # {"cameras": {"junction_1": {"padding": 16, "rois": {"northbound": [[x, y], ...]}}}}
+    config_path = Path(config_path)
+    if not config_path.exists():
+        return {}
+
+    with open(config_path) as f:
+        config = json.load(f)
+
+    return {
+        camera_id: CameraROI(camera_id, camera['rois'], padding=camera.get('padding', 16))
+        for camera_id, camera in config.get('cameras', {}).items()
+    }
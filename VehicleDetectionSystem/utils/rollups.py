@@ -0,0 +1,341 @@
+
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+
+DEFAULT_ROLLUP_DB = Path("store/rollups.db")
+
+# Bucket widths in seconds, finest first
+GRANULARITIES = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+# How long each granularity is kept; None keeps it forever. Coarser buckets are
+# written at ingest time, so pruning a finer level is the downsampling step.
+DEFAULT_RETENTION = {'minute': timedelta(days=14), 'hour': timedelta(days=400), 'day': None}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+-- One row per camera and bucket: frames/images seen, per-frame vehicle counts summed over
+-- them (vehicle-frames, only meaningful divided by observations) and the busiest frame.
+-- A vehicle in view for many frames is added once per frame, so these measure occupancy,
+-- not how many vehicles passed.
+CREATE TABLE IF NOT EXISTS bucket_totals (
+    granularity TEXT NOT NULL,
+    camera_id TEXT NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    observations INTEGER NOT NULL,
+    vehicle_frames INTEGER NOT NULL,
+    max_vehicles INTEGER NOT NULL,
+    PRIMARY KEY (granularity, camera_id, bucket_start)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS bucket_classes (
+    granularity TEXT NOT NULL,
+    camera_id TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    vehicle_frames INTEGER NOT NULL,
+    max_vehicles INTEGER NOT NULL,
+    PRIMARY KEY (granularity, camera_id, class_name, bucket_start)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_bucket_totals_time ON bucket_totals(granularity, bucket_start);
+CREATE INDEX IF NOT EXISTS idx_bucket_classes_time ON bucket_classes(granularity, class_name, bucket_start);
+"""
+
+UPSERT_TOTALS = (
+    "INSERT INTO bucket_totals "
+    "(granularity, camera_id, bucket_start, observations, vehicle_frames, max_vehicles) "
+    "VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (granularity, camera_id, bucket_start) DO UPDATE SET "
+    "observations = observations + excluded.observations, "
+    "vehicle_frames = vehicle_frames + excluded.vehicle_frames, "
+    "max_vehicles = MAX(max_vehicles, excluded.max_vehicles)"
+)
+
+UPSERT_CLASSES = (
+    "INSERT INTO bucket_classes "
+    "(granularity, camera_id, class_name, bucket_start, vehicle_frames, max_vehicles) "
+    "VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (granularity, camera_id, class_name, bucket_start) DO UPDATE SET "
+    "vehicle_frames = vehicle_frames + excluded.vehicle_frames, "
+    "max_vehicles = MAX(max_vehicles, excluded.max_vehicles)"
+)
+
+
+def to_epoch(value):
+
+    # datetime (naive means local time) or epoch seconds
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class RollupStore:
+
+    def __init__(self, db_path=DEFAULT_ROLLUP_DB, retention=None, utc_offset=None,
+                 flush_every=1000, flush_interval=5.0):
+
+        # utc_offset: seconds east of UTC where day buckets start; fixed when the store is
+        # created (defaults to this host's offset) so buckets never shift between sessions
+        if str(db_path) != ':memory:':
+            os.makedirs(Path(db_path).parent, exist_ok=True)
+
+        self.db_path = str(db_path)
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'utc_offset'").fetchone()
+        if row is None:
+            if utc_offset is None:
+                utc_offset = time.localtime().tm_gmtoff
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('utc_offset', ?)", (str(int(utc_offset)),))
+        elif utc_offset is not None and int(utc_offset) != int(row[0]):
+            raise ValueError(f"{self.db_path} was created with utc_offset={row[0]}, got {utc_offset}")
+        self.utc_offset = int(row[0]) if row is not None else int(utc_offset)
+        self.tz = timezone(timedelta(seconds=self.utc_offset))
+        self.conn.commit()
+
+        # Pending increments, merged in memory so a busy minute costs one upsert per level
+        self._totals = {}
+        self._classes = {}
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._last_prune = None
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def bucket_start(self, timestamp, granularity):
+        width = GRANULARITIES[granularity]
+        return int((int(timestamp) + self.utc_offset) // width * width - self.utc_offset)
+
+    def add(self, timestamp, detections, camera_id=None):
+
+        # One observation (image or video frame) at timestamp; camera_id defaults to
+        # the ROI camera the detections were filtered with
+        camera_id = camera_id or detections.get('camera_id') or 'default'
+        timestamp = to_epoch(timestamp)
+        vehicles = len(detections['labels'])
+
+        for granularity in GRANULARITIES:
+            bucket = self.bucket_start(timestamp, granularity)
+
+            totals = self._totals.get((granularity, camera_id, bucket))
+            if totals is None:
+                self._totals[(granularity, camera_id, bucket)] = [1, vehicles, vehicles]
+            else:
+                totals[0] += 1
+                totals[1] += vehicles
+                totals[2] = max(totals[2], vehicles)
+
+            for class_name, count in detections['class_counts'].items():
+                key = (granularity, camera_id, class_name, bucket)
+                classes = self._classes.get(key)
+                if classes is None:
+                    self._classes[key] = [count, count]
+                else:
+                    classes[0] += count
+                    classes[1] = max(classes[1], count)
+
+        self._pending += 1
+        if (self._pending >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+
+        if self._totals:
+            with self.conn:
+                self.conn.executemany(UPSERT_TOTALS, [key + tuple(value) for key, value in self._totals.items()])
+                self.conn.executemany(UPSERT_CLASSES, [key + tuple(value) for key, value in self._classes.items()])
+            self._totals.clear()
+            self._classes.clear()
+
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+        # Retention is cheap with the time indexes, but once an hour is plenty
+        if self._last_prune is None or time.monotonic() - self._last_prune >= 3600:
+            self.apply_retention()
+
+    def apply_retention(self, now=None):
+
+        now = to_epoch(now) if now is not None else time.time()
+        deleted = 0
+        with self.conn:
+            for granularity, keep in self.retention.items():
+                if keep is None:
+                    continue
+                cutoff = self.bucket_start(now - keep.total_seconds(), granularity)
+                for table in ("bucket_totals", "bucket_classes"):
+                    cursor = self.conn.execute(
+                        f"DELETE FROM {table} WHERE granularity = ? AND bucket_start < ?",
+                        (granularity, cutoff)
+                    )
+                    deleted += cursor.rowcount
+        self._last_prune = time.monotonic()
+        return deleted
+
+    def _retained(self, granularity, start, now=None):
+        keep = self.retention.get(granularity)
+        now = time.time() if now is None else now
+        return keep is None or start >= now - keep.total_seconds()
+
+    def cameras(self):
+        self.flush()
+        rows = self.conn.execute(
+            "SELECT camera_id, MIN(bucket_start), MAX(bucket_start), SUM(observations), "
+            "SUM(vehicle_frames), MAX(max_vehicles) "
+            "FROM bucket_totals WHERE granularity = 'day' GROUP BY camera_id ORDER BY camera_id"
+        ).fetchall()
+        return [
+            {
+                'camera_id': camera_id,
+                'first_day': datetime.fromtimestamp(first, self.tz),
+                'last_day': datetime.fromtimestamp(last, self.tz),
+                'observations': observations,
+                'avg_vehicles': vehicle_frames / observations if observations else 0.0,
+                'max_vehicles': max_vehicles,
+            }
+            for camera_id, first, last, observations, vehicle_frames, max_vehicles in rows
+        ]
+
+    def choose_granularity(self, start, end, max_points=500):
+
+        # Finest level that fits in max_points buckets and still holds data for start
+        start, end = to_epoch(start), to_epoch(end)
+        for granularity, width in GRANULARITIES.items():
+            if (end - start) / width <= max_points and self._retained(granularity, start):
+                return granularity
+        return list(GRANULARITIES)[-1]
+
+    def series(self, start, end, granularity=None, camera_id=None, class_name=None, max_points=500):
+
+        # Occupancy per bucket in [start, end), oldest first: vehicles in view per frame on
+        # average and in the busiest frame. class_name None gives all classes; camera_id None
+        # combines every camera. Empty buckets are omitted.
+        start, end = to_epoch(start), to_epoch(end)
+        self.flush()
+        granularity = granularity or self.choose_granularity(start, end, max_points)
+        lo = self.bucket_start(start, granularity)
+
+        # Observations always come from the totals row, so a bucket where the class was
+        # not seen still reports how many frames were looked at
+        if class_name is None:
+            sql = (
+                "SELECT t.bucket_start, SUM(t.observations), SUM(t.vehicle_frames), MAX(t.max_vehicles) "
+                "FROM bucket_totals t "
+                "WHERE t.granularity = ? AND t.bucket_start >= ? AND t.bucket_start < ?"
+            )
+            params = [granularity, lo, end]
+        else:
+            sql = (
+                "SELECT t.bucket_start, SUM(t.observations), "
+                "COALESCE(SUM(c.vehicle_frames), 0), COALESCE(MAX(c.max_vehicles), 0) "
+                "FROM bucket_totals t LEFT JOIN bucket_classes c "
+                "ON c.granularity = t.granularity AND c.camera_id = t.camera_id "
+                "AND c.bucket_start = t.bucket_start AND c.class_name = ? "
+                "WHERE t.granularity = ? AND t.bucket_start >= ? AND t.bucket_start < ?"
+            )
+            params = [class_name, granularity, lo, end]
+
+        if camera_id is not None:
+            sql += " AND t.camera_id = ?"
+            params.append(camera_id)
+        sql += " GROUP BY t.bucket_start ORDER BY t.bucket_start"
+
+        rows = self.conn.execute(sql, params).fetchall()
+        return [
+            {
+                'bucket_start': datetime.fromtimestamp(bucket, self.tz),
+                'granularity': granularity,
+                'observations': observations,
+                'avg_vehicles': vehicle_frames / observations if observations else 0.0,
+                'max_vehicles': max_vehicles,
+            }
+            for bucket, observations, vehicle_frames, max_vehicles in rows
+        ]
+
+    def _cover(self, start, end, levels):
+
+        # Split [start, end) into aligned spans, coarsest level first: whole days in the
+        # middle, whole hours at the edges, minutes for the rest
+        if start >= end:
+            return []
+
+        granularity, finer = levels[0], levels[1:]
+        width = GRANULARITIES[granularity]
+        if not finer:
+            # Finest level available: round outwards to whole buckets
+            return [(granularity, self.bucket_start(start, granularity), end)]
+
+        lo = self.bucket_start(start + width - 1, granularity)
+        hi = self.bucket_start(end, granularity)
+        if lo >= hi:
+            return self._cover(start, end, finer)
+        return (self._cover(start, lo, finer) + [(granularity, lo, hi)] + self._cover(hi, end, finer))
+
+    def totals(self, start, end, camera_id=None):
+
+        # Occupancy over [start, end), overall and per class, from at most a few hundred
+        # buckets whatever the range
+        start, end = to_epoch(start), to_epoch(end)
+        self.flush()
+
+        levels = [g for g in reversed(list(GRANULARITIES)) if self._retained(g, start)]
+        spans = self._cover(start, end, levels)
+
+        where = " OR ".join("(granularity = ? AND bucket_start >= ? AND bucket_start < ?)" for _ in spans)
+        params = [value for span in spans for value in span]
+        camera_filter = ""
+        if camera_id is not None:
+            camera_filter = " AND camera_id = ?"
+            params.append(camera_id)
+
+        result = {'observations': 0, 'avg_vehicles': 0.0, 'max_vehicles': 0, 'classes': {}, 'spans': spans}
+        if not spans:
+            return result
+
+        observations, vehicle_frames, max_vehicles = self.conn.execute(
+            f"SELECT SUM(observations), SUM(vehicle_frames), MAX(max_vehicles) FROM bucket_totals "
+            f"WHERE ({where}){camera_filter}",
+            params
+        ).fetchone()
+        observations = observations or 0
+        if not observations:
+            return result
+        result['observations'] = observations
+        result['avg_vehicles'] = (vehicle_frames or 0) / observations
+        result['max_vehicles'] = max_vehicles or 0
+
+        # Frames where a class was absent count as zero, so class averages share the denominator
+        rows = self.conn.execute(
+            f"SELECT class_name, SUM(vehicle_frames), MAX(max_vehicles) FROM bucket_classes "
+            f"WHERE ({where}){camera_filter} GROUP BY class_name ORDER BY SUM(vehicle_frames) DESC",
+            params
+        ).fetchall()
+        result['classes'] = {
+            class_name: {'avg_vehicles': class_frames / observations, 'max_vehicles': class_max}
+            for class_name, class_frames, class_max in rows
+        }
+        return result
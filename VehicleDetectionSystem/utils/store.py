@@ -0,0 +1,249 @@
+
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    model_path TEXT,
+    confidence_threshold REAL
+);
+
+CREATE TABLE IF NOT EXISTS images (
+    image_id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    image_name TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    total_vehicles INTEGER NOT NULL,
+    UNIQUE (run_id, image_name)
+);
+
+CREATE TABLE IF NOT EXISTS detections (
+    detection_id INTEGER PRIMARY KEY,
+    image_id INTEGER NOT NULL REFERENCES images(image_id),
+    class_name TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    x1 INTEGER NOT NULL,
+    y1 INTEGER NOT NULL,
+    x2 INTEGER NOT NULL,
+    y2 INTEGER NOT NULL,
+    area INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS image_class_counts (
+    image_id INTEGER NOT NULL REFERENCES images(image_id),
+    class_name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (class_name, count, image_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_images_run ON images(run_id);
+CREATE INDEX IF NOT EXISTS idx_detections_class ON detections(class_name, confidence);
+CREATE INDEX IF NOT EXISTS idx_detections_image ON detections(image_id);
+CREATE INDEX IF NOT EXISTS idx_detections_area ON detections(area);
+
+-- Box extents normalised to 0-1 so regions can be expressed independently of image size
+CREATE VIRTUAL TABLE IF NOT EXISTS detection_boxes USING rtree(
+    detection_id,
+    min_x, max_x,
+    min_y, max_y
+);
+"""
+
+
+def new_run_id():
+    return datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+
+class DetectionStore:
+
+    def __init__(self, db_path, commit_every=500):
+
+        if str(db_path) != ':memory:':
+            os.makedirs(Path(db_path).parent, exist_ok=True)
+
+        self.db_path = str(db_path)
+        self.commit_every = commit_every
+        self._pending = 0
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def commit(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def start_run(self, run_id=None, model_path=None, confidence_threshold=None):
+
+        run_id = run_id or new_run_id()
+        self.conn.execute(
+            "INSERT OR IGNORE INTO runs (run_id, created_at, model_path, confidence_threshold) "
+            "VALUES (?, ?, ?, ?)",
+            (run_id, datetime.now().isoformat(timespec='seconds'), model_path, confidence_threshold)
+        )
+        self.commit()
+        return run_id
+
+    def add_image(self, run_id, image_name, detections):
+
+        width, height = detections.get('image_size') or (None, None)
+
+        # Re-running an image within the same run replaces its previous detections
+        row = self.conn.execute(
+            "SELECT image_id FROM images WHERE run_id = ? AND image_name = ?",
+            (run_id, image_name)
+        ).fetchone()
+        if row is not None:
+            self._delete_image(row[0])
+
+        cursor = self.conn.execute(
+            "INSERT INTO images (run_id, image_name, width, height, total_vehicles) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (run_id, image_name, width, height, len(detections['labels']))
+        )
+        image_id = cursor.lastrowid
+
+        for box, label, conf in zip(detections['boxes'], detections['labels'], detections['confidences']):
+            x1, y1, x2, y2 = box
+            cursor = self.conn.execute(
+                "INSERT INTO detections (image_id, class_name, confidence, x1, y1, x2, y2, area) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (image_id, label, conf, x1, y1, x2, y2, (x2 - x1) * (y2 - y1))
+            )
+            if width and height:
+                self.conn.execute(
+                    "INSERT INTO detection_boxes VALUES (?, ?, ?, ?, ?)",
+                    (cursor.lastrowid, x1 / width, x2 / width, y1 / height, y2 / height)
+                )
+
+        self.conn.executemany(
+            "INSERT INTO image_class_counts (image_id, class_name, count) VALUES (?, ?, ?)",
+            [(image_id, label, count) for label, count in detections['class_counts'].items()]
+        )
+
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+        return image_id
+
+    def _delete_image(self, image_id):
+        self.conn.execute(
+            "DELETE FROM detection_boxes WHERE detection_id IN "
+            "(SELECT detection_id FROM detections WHERE image_id = ?)",
+            (image_id,)
+        )
+        self.conn.execute("DELETE FROM detections WHERE image_id = ?", (image_id,))
+        self.conn.execute("DELETE FROM image_class_counts WHERE image_id = ?", (image_id,))
+        self.conn.execute("DELETE FROM images WHERE image_id = ?", (image_id,))
+
+    def list_runs(self):
+        rows = self.conn.execute(
+            "SELECT r.run_id, r.created_at, r.model_path, COUNT(i.image_id) "
+            "FROM runs r LEFT JOIN images i ON i.run_id = r.run_id "
+            "GROUP BY r.run_id ORDER BY r.created_at DESC"
+        ).fetchall()
+        return [
+            {'run_id': run_id, 'created_at': created_at, 'model_path': model_path, 'images': images}
+            for run_id, created_at, model_path, images in rows
+        ]
+
+    def query_images(self, class_name, min_count=1, max_count=None, run_id=None, limit=None):
+
+        # Served entirely from the (class_name, count, image_id) primary key
+        sql = (
+            "SELECT i.run_id, i.image_name, c.class_name, c.count "
+            "FROM image_class_counts c JOIN images i ON i.image_id = c.image_id "
+            "WHERE c.class_name = ? AND c.count >= ?"
+        )
+        params = [class_name, min_count]
+
+        if max_count is not None:
+            sql += " AND c.count <= ?"
+            params.append(max_count)
+        if run_id is not None:
+            sql += " AND i.run_id = ?"
+            params.append(run_id)
+
+        sql += " ORDER BY c.count DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        rows = self.conn.execute(sql, params).fetchall()
+        return [
+            {'run_id': r, 'image_name': name, 'class_name': cls, 'count': count}
+            for r, name, cls, count in rows
+        ]
+
+    def query_detections(self, class_name=None, min_confidence=None, min_area=None,
+                         region=None, run_id=None, limit=None):
+
+        # region is (x1, y1, x2, y2) in normalised 0-1 coordinates; boxes must lie inside it
+        params = []
+        if region is not None:
+            rx1, ry1, rx2, ry2 = region
+            sql = (
+                "SELECT d.detection_id, i.run_id, i.image_name, d.class_name, d.confidence, "
+                "d.x1, d.y1, d.x2, d.y2 "
+                "FROM detection_boxes b "
+                "JOIN detections d ON d.detection_id = b.detection_id "
+                "JOIN images i ON i.image_id = d.image_id "
+                "WHERE b.min_x >= ? AND b.max_x <= ? AND b.min_y >= ? AND b.max_y <= ?"
+            )
+            params.extend([rx1, rx2, ry1, ry2])
+        else:
+            sql = (
+                "SELECT d.detection_id, i.run_id, i.image_name, d.class_name, d.confidence, "
+                "d.x1, d.y1, d.x2, d.y2 "
+                "FROM detections d JOIN images i ON i.image_id = d.image_id "
+                "WHERE 1 = 1"
+            )
+
+        if class_name is not None:
+            sql += " AND d.class_name = ?"
+            params.append(class_name)
+        if min_confidence is not None:
+            sql += " AND d.confidence >= ?"
+            params.append(min_confidence)
+        if min_area is not None:
+            sql += " AND d.area >= ?"
+            params.append(min_area)
+        if run_id is not None:
+            sql += " AND i.run_id = ?"
+            params.append(run_id)
+
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        rows = self.conn.execute(sql, params).fetchall()
+        return [
+            {
+                'detection_id': detection_id,
+                'run_id': r,
+                'image_name': name,
+                'class_name': cls,
+                'confidence': conf,
+                'box': [x1, y1, x2, y2],
+            }
+            for detection_id, r, name, cls, conf, x1, y1, x2, y2 in rows
+        ]
@@ -0,0 +1,131 @@
+
+import itertools
+import json
+import os
+import platform
+import socket
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+DEFAULT_PROFILE_PATH = Path("models/inference_profile.json")
+
+
+def host_key():
+    # Profiles are only valid on the machine they were measured on
+    return f"{socket.gethostname()}/{platform.machine()}/{os.cpu_count()}cpu"
+
+
+def load_profile(profile_path=DEFAULT_PROFILE_PATH):
+
+    profile_path = Path(profile_path)
+    if not profile_path.exists():
+        return None
+
+    try:
+        with open(profile_path) as f:
+            profiles = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    return profiles.get('hosts', {}).get(host_key())
+
+
+def save_profile(profile, profile_path=DEFAULT_PROFILE_PATH):
+
+    profile_path = Path(profile_path)
+    os.makedirs(profile_path.parent, exist_ok=True)
+
+    # Keep profiles of other hosts sharing the same models directory
+    profiles = {'hosts': {}}
+    if profile_path.exists():
+        try:
+            with open(profile_path) as f:
+                profiles = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    profiles.setdefault('hosts', {})[host_key()] = profile
+
+    tmp_path = profile_path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(tmp_path, profile_path)
+
+    return profile_path
+
+
+def apply_runtime_settings(model, profile):
+
+    import torch
+
+    threads = profile.get('torch_threads')
+    if threads:
+        torch.set_num_threads(int(threads))
+
+    # channels_last can speed up CPU convolutions considerably on some hosts
+    memory_format = torch.channels_last if profile.get('channels_last') else torch.contiguous_format
+    model.model.to(memory_format=memory_format)
+
+
+def candidate_threads():
+    cpus = os.cpu_count() or 1
+    return sorted({1, max(1, cpus // 2), cpus})
+
+
+def measure_settings(detector, image_paths, warmup=1):
+
+    # Warm up so one-off setup (predictor, allocator) is not counted
+    for _ in range(warmup):
+        detector.detect_batch(image_paths[:detector.batch_size])
+
+    batch_latencies = []
+    start = time.perf_counter()
+    for i in range(0, len(image_paths), detector.batch_size):
+        batch = image_paths[i:i + detector.batch_size]
+        batch_start = time.perf_counter()
+        detector.detect_batch(batch)
+        batch_latencies.append((time.perf_counter() - batch_start) / len(batch))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'throughput_ips': len(image_paths) / elapsed,
+        'latency_ms': statistics.median(batch_latencies) * 1000,
+    }
+
+
+def autotune(detector, image_paths, threads=None, batch_sizes=(1, 4, 8), imgsz=None,
+             memory_formats=(False, True), progress=None):
+
+    # Only settings that leave the output unchanged are swept. imgsz trades accuracy for
+    # speed, so it is fixed by the caller (None keeps the model's own size); evaluate.py
+    # reports what a smaller size costs.
+    threads = threads or candidate_threads()
+    trials = []
+
+    for torch_threads, batch_size, channels_last in itertools.product(threads, batch_sizes, memory_formats):
+        settings = {
+            'torch_threads': torch_threads,
+            'batch_size': batch_size,
+            'imgsz': imgsz,
+            'channels_last': channels_last,
+        }
+        detector.apply_profile(settings)
+        trial = {**settings, **measure_settings(detector, image_paths)}
+        trials.append(trial)
+
+        if progress is not None:
+            progress(trial)
+
+    # Highest throughput wins, lower per-image latency breaks ties
+    best = max(trials, key=lambda t: (round(t['throughput_ips'], 2), -t['latency_ms']))
+
+    return {
+        **best,
+        'host': host_key(),
+        'sample_images': len(image_paths),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'trials': trials,
+    }
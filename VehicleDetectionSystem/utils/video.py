@@ -0,0 +1,38 @@
+
+import cv2
+
+
+def open_capture(source):
+
+    # Digits select a local camera index, anything else is a file path or stream URL
+    capture = cv2.VideoCapture(int(source) if str(source).isdigit() else str(source))
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video source: {source}")
+    return capture
+
+
+def iter_frames(source, frame_step=1):
+
+    # Yield (frame_index, timestamp_seconds, frame) for every frame_step-th frame
+    capture = open_capture(source)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 0
+    index = 0
+
+    try:
+        while True:
+            ok = capture.grab()
+            if not ok:
+                break
+
+            if index % frame_step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+                if not timestamp and fps:
+                    timestamp = index / fps
+                yield index, timestamp, frame
+
+            index += 1
+    finally:
+        capture.release()
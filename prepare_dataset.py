@@ -0,0 +1,312 @@
+"""
+Dataset Preparation - NeuroDrive
+Checks image/label pairs, drops exact duplicate images and pre-resizes
+everything to the training imgsz once. The result is a memory-mapped
+uint8 array per split plus a label index, so repeated training and
+validation runs read prepared tensors instead of decoding JPEGs.
+
+Usage:
+    python prepare_dataset.py --dataset "datasets/Vehicle data set v5" --imgsz 640
+
+Output (in --output, default datasets/prepared_<imgsz>):
+    data.yaml                  dataset config for prepared_training.py (and plain ultralytics)
+    manifest.json              sizes, class names, per-split statistics
+    <split>_images.npy         (N, imgsz, imgsz, 3) uint8 BGR, letterboxed
+    <split>_labels.npy         (M, 5) float32 rows of class, x, y, w, h (normalised, letterboxed)
+    <split>_offsets.npy        (N + 1,) int64, labels of image i are rows offsets[i]:offsets[i+1]
+    <split>_files.txt          absolute source image path of each row
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+import yaml
+from PIL import Image
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'}
+PAD_VALUE = 114  # Same grey padding ultralytics uses for letterboxing
+
+
+def find_split_images(dataset_dir, split):
+    images_dir = Path(dataset_dir) / split / "images"
+    if not images_dir.exists():
+        return []
+    return sorted(p for p in images_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def label_path_for(image_path):
+    return image_path.parent.parent / "labels" / f"{image_path.stem}.txt"
+
+
+def read_labels(label_path, num_classes):
+
+    # Returns (labels (M, 5) float32, error message or None)
+    if not label_path.exists():
+        return np.zeros((0, 5), dtype=np.float32), None
+
+    try:
+        labels = np.loadtxt(label_path, ndmin=2, dtype=np.float32)
+    except ValueError as e:
+        return None, f"unparseable ({e})"
+
+    if labels.size == 0:
+        return np.zeros((0, 5), dtype=np.float32), None
+    if labels.shape[1] != 5:
+        return None, f"expected 5 columns, found {labels.shape[1]}"
+
+    classes = labels[:, 0]
+    if np.any(classes != np.round(classes)) or np.any(classes < 0) or np.any(classes >= num_classes):
+        return None, "class id out of range"
+    if np.any(labels[:, 1:] < 0) or np.any(labels[:, 1:] > 1):
+        return None, "coordinates not normalised"
+    if np.any(labels[:, 3:] <= 0):
+        return None, "zero-size box"
+
+    # Identical rows are annotation noise; keep one
+    labels = np.unique(labels, axis=0)
+    return labels, None
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def letterbox(image, imgsz):
+
+    # Resize the long side to imgsz and pad to a square, returning the transform
+    height, width = image.shape[:2]
+    scale = imgsz / max(height, width)
+    new_w, new_h = round(width * scale), round(height * scale)
+
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(image, (new_w, new_h), interpolation=interpolation)
+
+    pad_x, pad_y = (imgsz - new_w) // 2, (imgsz - new_h) // 2
+    canvas = np.full((imgsz, imgsz, 3), PAD_VALUE, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+
+    return canvas, (new_w / imgsz, new_h / imgsz, pad_x / imgsz, pad_y / imgsz)
+
+
+def decode(image_path, imgsz):
+
+    # JPEG draft mode lets libjpeg downscale by 2/4/8 while decoding, never below imgsz
+    try:
+        with Image.open(image_path) as image:
+            image.draft("RGB", (imgsz, imgsz))
+            rgb = np.asarray(image.convert("RGB"))
+    except OSError:
+        return None
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+
+def scan_split(dataset_dir, split, num_classes, seen_digests):
+
+    stats = {'images': 0, 'kept': 0, 'duplicates': 0, 'bad_labels': 0, 'unreadable': 0,
+             'background': 0, 'orphan_labels': 0}
+    entries = []
+    problems = []
+
+    images = find_split_images(dataset_dir, split)
+    stats['images'] = len(images)
+
+    for image_path in images:
+        digest = file_digest(image_path)
+        if digest in seen_digests:
+            stats['duplicates'] += 1
+            problems.append(f"{image_path}: duplicate of {seen_digests[digest]}")
+            continue
+
+        # Header check only; full decoding happens once, when writing the cache
+        try:
+            with Image.open(image_path) as image:
+                image.verify()
+        except Exception:
+            stats['unreadable'] += 1
+            problems.append(f"{image_path}: unreadable image")
+            continue
+
+        labels, error = read_labels(label_path_for(image_path), num_classes)
+        if error is not None:
+            stats['bad_labels'] += 1
+            problems.append(f"{label_path_for(image_path)}: {error}")
+            continue
+
+        seen_digests[digest] = image_path
+        if len(labels) == 0:
+            stats['background'] += 1
+        entries.append((image_path, labels))
+
+    # Labels without an image usually mean a renamed or deleted file
+    labels_dir = Path(dataset_dir) / split / "labels"
+    if labels_dir.exists():
+        stems = {p.stem for p in images}
+        orphans = [p for p in labels_dir.glob("*.txt") if p.stem not in stems]
+        stats['orphan_labels'] = len(orphans)
+        problems.extend(f"{p}: no matching image" for p in orphans)
+
+    return entries, stats, problems
+
+
+def shrink_memmap(path, rows, chunk=256):
+
+    # Rewrite an .npy keeping only its first rows, copying in chunks to bound memory
+    source = np.load(path, mmap_mode="r")
+    tmp_path = path.with_name(f"{path.stem}.tmp.npy")
+    target = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=source.dtype, shape=(rows,) + source.shape[1:])
+    for start in range(0, rows, chunk):
+        target[start:start + chunk] = source[start:min(start + chunk, rows)]
+    target.flush()
+    del target, source
+    os.replace(tmp_path, path)
+
+
+def write_split(entries, split, output_dir, imgsz, stats, problems):
+
+    images_path = output_dir / f"{split}_images.npy"
+    images = np.lib.format.open_memmap(
+        images_path, mode="w+", dtype=np.uint8,
+        shape=(len(entries), imgsz, imgsz, 3)
+    )
+
+    all_labels = []
+    offsets = [0]
+    files = []
+    row = 0
+
+    for image_path, labels in entries:
+        image = decode(image_path, imgsz)
+        if image is None:
+            # Passed the header check but failed to decode: leave it out entirely
+            stats['unreadable'] += 1
+            problems.append(f"{image_path}: could not be decoded")
+            continue
+
+        images[row], (scale_w, scale_h, pad_x, pad_y) = letterbox(image, imgsz)
+        row += 1
+
+        # Map normalised boxes into the letterboxed frame
+        if len(labels):
+            labels = labels.copy()
+            labels[:, 1] = labels[:, 1] * scale_w + pad_x
+            labels[:, 2] = labels[:, 2] * scale_h + pad_y
+            labels[:, 3] *= scale_w
+            labels[:, 4] *= scale_h
+        all_labels.append(labels)
+        offsets.append(offsets[-1] + len(labels))
+        files.append(str(Path(image_path).resolve()))
+
+    images.flush()
+    del images
+    if row < len(entries):
+        shrink_memmap(images_path, row)
+
+    labels = np.concatenate(all_labels) if all_labels else np.zeros((0, 5), dtype=np.float32)
+    np.save(output_dir / f"{split}_labels.npy", labels.astype(np.float32))
+    np.save(output_dir / f"{split}_offsets.npy", np.asarray(offsets, dtype=np.int64))
+    with open(output_dir / f"{split}_files.txt", "w") as f:
+        f.write("\n".join(files))
+
+    stats['kept'] = row
+    stats['boxes'] = int(len(labels))
+
+
+class PreparedDataset:
+    """Read-only view of one prepared split, indexable like a list of (image, labels)"""
+
+    def __init__(self, prepared_dir, split):
+        prepared_dir = Path(prepared_dir)
+        self.images = np.load(prepared_dir / f"{split}_images.npy", mmap_mode="r")
+        self.labels = np.load(prepared_dir / f"{split}_labels.npy")
+        self.offsets = np.load(prepared_dir / f"{split}_offsets.npy")
+        with open(prepared_dir / "manifest.json") as f:
+            self.manifest = json.load(f)
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.images[index], self.labels[start:end]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a memory-mapped training cache")
+    parser.add_argument("--dataset", required=True, help="Dataset root with data.yaml and split folders")
+    parser.add_argument("--imgsz", type=int, default=640, help="Training image size")
+    parser.add_argument("--splits", nargs="+", default=["valid", "test", "train"],
+                        help="Splits in priority order; a duplicate is kept in the first split it appears in")
+    parser.add_argument("--output", help="Output folder (default: datasets/prepared_<imgsz>)")
+    args = parser.parse_args()
+
+    dataset_dir = Path(args.dataset)
+    with open(dataset_dir / "data.yaml") as f:
+        names = yaml.safe_load(f)['names']
+    if isinstance(names, dict):
+        names = [names[k] for k in sorted(names)]
+
+    output_dir = Path(args.output or f"datasets/prepared_{args.imgsz}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    print("="*60)
+    print(f"Preparing {dataset_dir} at imgsz={args.imgsz}")
+    print("="*60)
+
+    seen_digests = {}
+    manifest = {
+        'source': str(dataset_dir),
+        'imgsz': args.imgsz,
+        'names': names,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'splits': {},
+    }
+    all_problems = []
+
+    for split in args.splits:
+        entries, stats, problems = scan_split(dataset_dir, split, len(names), seen_digests)
+        if not stats['images']:
+            print(f"\n {split}: no images, skipped")
+            continue
+
+        write_split(entries, split, output_dir, args.imgsz, stats, problems)
+        manifest['splits'][split] = stats
+        all_problems.extend(problems)
+
+        print(f"\n {split}:")
+        for key, value in stats.items():
+            print(f"   {key:<14} {value}")
+
+    with open(output_dir / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Splits point at the source file lists: prepared_training.py maps them to the cache,
+    # plain ultralytics falls back to reading the original images
+    splits = manifest['splits']
+    data_yaml = {'path': str(output_dir.resolve()), 'names': dict(enumerate(names))}
+    for key, candidates in (('train', ['train']), ('val', ['valid', 'val']), ('test', ['test'])):
+        split = next((name for name in candidates if name in splits), None)
+        if split is not None:
+            data_yaml[key] = f"{split}_files.txt"
+    with open(output_dir / "data.yaml", "w") as f:
+        yaml.safe_dump(data_yaml, f, sort_keys=False)
+    with open(output_dir / "problems.txt", "w") as f:
+        f.writelines(f"{problem}\n" for problem in all_problems)
+
+    print(f"\n {len(all_problems)} problem(s) listed in {output_dir / 'problems.txt'}")
+    print(f" Cache written to {output_dir}")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
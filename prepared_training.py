@@ -0,0 +1,158 @@
+"""
+Prepared-Cache Training - NeuroDrive
+Ultralytics trainer and validator that read the memory-mapped cache written
+by prepare_dataset.py instead of decoding and resizing JPEGs every epoch.
+Augmentation (mosaic, HSV, flips, ...) still runs on the fly as usual.
+
+Usage (see training.ipynb):
+    from prepared_training import PreparedDetectionTrainer, PreparedDetectionValidator
+
+    model.train(data="datasets/prepared_640/data.yaml", trainer=PreparedDetectionTrainer, imgsz=640)
+    model.val(data="datasets/prepared_640/data.yaml", validator=PreparedDetectionValidator)
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+from ultralytics.data.build import build_yolo_dataset
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer, DetectionValidator
+from ultralytics.utils import colorstr
+from ultralytics.utils.torch_utils import de_parallel
+
+
+FILES_SUFFIX = "_files.txt"
+
+
+def prepared_split(img_path):
+
+    # (cache dir, split) when img_path is a <split>_files.txt list inside a prepared cache
+    path = Path(img_path) if isinstance(img_path, (str, Path)) else None
+    if path is None or not path.name.endswith(FILES_SUFFIX):
+        return None
+    if not (path.parent / "manifest.json").exists():
+        return None
+    return path.parent, path.name[:-len(FILES_SUFFIX)]
+
+
+class PreparedYOLODataset(YOLODataset):
+
+    def __init__(self, *args, prepared_dir, split, **kwargs):
+
+        # Letterboxed rows and their labels come straight from the cache files
+        self.prepared_dir = Path(prepared_dir)
+        self.split = split
+        with open(self.prepared_dir / "manifest.json") as f:
+            self.manifest = json.load(f)
+        self._images = None
+
+        imgsz = kwargs.get('imgsz', 640)
+        if imgsz != self.manifest['imgsz']:
+            raise ValueError(f"{self.prepared_dir} was prepared at imgsz={self.manifest['imgsz']}, "
+                             f"training asked for {imgsz}")
+
+        # The cache already is the decoded, resized copy; ultralytics' own cache would duplicate it
+        kwargs['cache'] = False
+        super().__init__(*args, **kwargs)
+
+    @property
+    def images(self):
+        # Opened lazily so dataloader workers each map the file instead of pickling the array
+        if self._images is None:
+            self._images = np.load(self.prepared_dir / f"{self.split}_images.npy", mmap_mode="r")
+        return self._images
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+    def get_img_files(self, img_path):
+        with open(img_path) as f:
+            files = f.read().splitlines()
+        if self.fraction < 1:
+            files = files[:round(len(files) * self.fraction)]
+        return files
+
+    def get_labels(self):
+
+        labels = np.load(self.prepared_dir / f"{self.split}_labels.npy")
+        offsets = np.load(self.prepared_dir / f"{self.split}_offsets.npy")
+        imgsz = self.manifest['imgsz']
+
+        # Rectangular val batches reorder im_files, so rows are looked up by file
+        self.rows = {}
+        result = []
+        for row, im_file in enumerate(self.im_files):
+            self.rows[im_file] = row
+            lb = labels[offsets[row]:offsets[row + 1]]
+            result.append(dict(
+                im_file=im_file,
+                shape=(imgsz, imgsz),
+                cls=lb[:, 0:1].copy(),
+                bboxes=lb[:, 1:].copy(),
+                segments=[],
+                keypoints=None,
+                normalized=True,
+                bbox_format='xywh'))
+        return result
+
+    def load_image(self, i, rect_mode=True):
+
+        if self.ims[i] is not None:
+            return self.ims[i], self.im_hw0[i], self.im_hw[i]
+
+        im = np.array(self.images[self.rows[self.im_files[i]]])
+        hw = im.shape[:2]
+
+        # Same mosaic buffer bookkeeping as BaseDataset.load_image
+        if self.augment:
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, hw, hw
+            self.buffer.append(i)
+            if len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+
+        return im, hw, hw
+
+
+def build_prepared_dataset(cfg, img_path, batch, data, mode='train', rect=False, stride=32):
+
+    # Mirrors ultralytics' build_yolo_dataset; any other source is built the normal way
+    prepared = prepared_split(img_path)
+    if prepared is None:
+        return build_yolo_dataset(cfg, img_path, batch, data, mode=mode, rect=rect, stride=stride)
+
+    prepared_dir, split = prepared
+    return PreparedYOLODataset(
+        img_path=img_path,
+        imgsz=cfg.imgsz,
+        batch_size=batch,
+        augment=mode == 'train',
+        hyp=cfg,
+        rect=cfg.rect or rect,
+        single_cls=cfg.single_cls or False,
+        stride=int(stride),
+        pad=0.0 if mode == 'train' else 0.5,
+        prefix=colorstr(f'{mode}: '),
+        classes=cfg.classes,
+        data=data,
+        fraction=cfg.fraction if mode == 'train' else 1.0,
+        prepared_dir=prepared_dir,
+        split=split)
+
+
+class PreparedDetectionTrainer(DetectionTrainer):
+
+    # The validator run after each epoch reuses these loaders, so it reads the cache too
+    def build_dataset(self, img_path, mode='train', batch=None):
+        gs = max(int(de_parallel(self.model).stride.max() if self.model else 0), 32)
+        return build_prepared_dataset(self.args, img_path, batch, self.data, mode=mode, rect=mode == 'val', stride=gs)
+
+
+class PreparedDetectionValidator(DetectionValidator):
+
+    def build_dataset(self, img_path, mode='val', batch=None):
+        gs = max(int(de_parallel(self.model).stride if self.model else 0), 32)
+        return build_prepared_dataset(self.args, img_path, batch, self.data, mode=mode, stride=gs)